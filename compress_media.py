@@ -1,6 +1,13 @@
 import os
+import argparse
 import subprocess
 import time
+import threading
+import queue
+import csv
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from rich.console import Console
 from rich.live import Live
 from rich.table import Table
@@ -11,12 +18,80 @@ from rich.align import Align
 import psutil
 from pynvml import *
 
+try:
+    from blake3 import blake3 as file_hasher
+except ImportError:
+    from hashlib import blake2b as file_hasher
+
+# Consumer NVIDIA GPUs allow a handful of concurrent NVENC sessions
+NVENC_SESSIONS = 2
+# Only the most recent results are rendered; the full history goes to the CSV log
+RECENT_ROWS = 20
+
 def get_file_size(file_path):
     try:
         return os.path.getsize(file_path)
     except FileNotFoundError:
         return 0
 
+def batch_file_sizes(paths, max_workers=32):
+    # os.stat releases the GIL, so a thread pool overlaps the per-file metadata round-trips
+    paths = list(paths)
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(paths, executor.map(get_file_size, paths)))
+
+def file_digest(path, limit=None, chunk_size=1 << 20):
+    # Hash the whole file, or only its first `limit` bytes
+    hasher = file_hasher()
+    remaining = limit
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return hasher.hexdigest()
+
+def find_duplicates(paths, sizes, head_bytes=1 << 20):
+    # Returns {duplicate_path: first_path_with_same_content}. Only equal-size files are hashed:
+    # first by their leading head_bytes, then in full for files that still collide.
+    by_size = {}
+    for path in paths:
+        by_size.setdefault(sizes[path], []).append(path)
+    duplicates = {}
+    for size, same_size in by_size.items():
+        if len(same_size) < 2:
+            continue
+        by_head = {}
+        for path in same_size:
+            by_head.setdefault(file_digest(path, head_bytes), []).append(path)
+        for same_head in by_head.values():
+            if len(same_head) < 2:
+                continue
+            if size <= head_bytes:
+                groups = [same_head]
+            else:
+                by_full = {}
+                for path in same_head:
+                    by_full.setdefault(file_digest(path), []).append(path)
+                groups = by_full.values()
+            for group in groups:
+                for path in group[1:]:
+                    duplicates[path] = group[0]
+    return duplicates
+
+def link_or_copy(src, dst):
+    try:
+        if os.path.lexists(dst):
+            os.remove(dst)
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
 def format_size(size_bytes):
     if size_bytes > 1024 * 1024:
         return f"{size_bytes / (1024 * 1024):.2f} MB"
@@ -36,10 +111,83 @@ def make_layout() -> Layout:
     layout["side"].split(Layout(name="system_stats"), Layout(name="total_stats"))
     return layout
 
-def compress_media(input_dir, output_dir):
+def make_results_table(rows):
+    results_table = Table(title=f"File Compression Statistics (latest {RECENT_ROWS})")
+    results_table.add_column("Filename", style="cyan")
+    results_table.add_column("Original Size", style="magenta")
+    results_table.add_column("Compressed Size", style="green")
+    results_table.add_column("Ratio", style="blue")
+    results_table.add_column("Savings", style="yellow")
+    for row in rows:
+        results_table.add_row(*row)
+    return results_table
+
+def build_command(filename, input_path, output_path):
+    if filename.lower().endswith('.mp4'):
+        return [
+            'ffmpeg', '-y', '-i', input_path, '-r', '24', '-c:v', 'h264_nvenc',
+            '-preset', 'slow', '-rc', 'vbr', '-cq', '32', '-c:a', 'copy', output_path
+        ]
+    elif filename.lower().endswith('.jpg'):
+        return ['ffmpeg', '-y', '-i', input_path, '-q:v', '8', output_path]
+    return None
+
+def run_job(filename, command, original_size, output_path):
+    subprocess.run(command, capture_output=True)
+    return filename, original_size, get_file_size(output_path)
+
+# psutil.sensors_temperatures() re-reads /sys/class/hwmon/* on every call
+_cpu_temp_cache = {'ts': 0.0, 'value': "N/A"}
+
+def get_cpu_temp_str(ttl=1.0):
+    now = time.monotonic()
+    if now - _cpu_temp_cache['ts'] >= ttl:
+        cpu_temp = psutil.sensors_temperatures().get('coretemp', [None])[0]
+        _cpu_temp_cache['value'] = f"{cpu_temp.current}°C" if cpu_temp else "N/A"
+        _cpu_temp_cache['ts'] = now
+    return _cpu_temp_cache['value']
+
+def read_stats(handle):
+    cpu_usage = psutil.cpu_percent()
+    gpu_util = nvmlDeviceGetUtilizationRates(handle)
+    gpu_mem = nvmlDeviceGetMemoryInfo(handle)
+    gpu_temp = nvmlDeviceGetTemperature(handle, NVML_TEMPERATURE_GPU)
+    power_usage = nvmlDeviceGetPowerUsage(handle) / 1000.0 # In Watts
+    return {
+        "CPU Usage": f"{cpu_usage}%",
+        "CPU Temp": get_cpu_temp_str(),
+        "GPU Usage": f"{gpu_util.gpu}%",
+        "GPU Temp": f"{gpu_temp}°C",
+        "GPU RAM": f"{gpu_mem.used / gpu_mem.total * 100:.2f}% ({format_size(gpu_mem.used)})",
+        "GPU Power": f"{power_usage:.2f}W",
+    }
+
+def make_stats_panel(values):
+    # A fresh table per change: Live's refresh thread may be rendering the previous one
+    stats_table = Table(title="System Stats")
+    stats_table.add_column("Metric", style="bold")
+    stats_table.add_column("Value")
+    for key, value in values.items():
+        stats_table.add_row(key, value)
+    return Panel(stats_table, title="Live Stats", border_style="blue")
+
+def sample_stats(handle, latest, lock, stop_event, interval=0.1):
+    # Sample system stats off the main thread; the main thread owns all layout updates
+    while not stop_event.is_set():
+        try:
+            values = read_stats(handle)
+            with lock:
+                latest.clear()
+                latest.update(values)
+        except NVMLError:
+            pass
+        stop_event.wait(interval)
+
+def compress_media(input_dir, output_dir, max_sessions=NVENC_SESSIONS, interactive=False):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
+    console = Console()
     try:
         nvmlInit()
         handle = nvmlDeviceGetHandleByIndex(0)
@@ -47,114 +195,155 @@ def compress_media(input_dir, output_dir):
         console.print(f"NVIDIA driver error: {error}", style="bold red")
         return
 
-    files_to_process = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f))]
-    total_files = len(files_to_process)
+    # Everything after nvmlInit runs under try/finally so NVML and the stats thread are released on errors/Ctrl-C
+    stop_event = threading.Event()
+    stats_thread = None
+    try:
+        with os.scandir(input_dir) as it:
+            files_to_process = [e.name for e in it if e.is_file()]
+        total_files = len(files_to_process)
 
-    console = Console()
-    results_table = Table(title="File Compression Statistics")
-    results_table.add_column("Filename", style="cyan")
-    results_table.add_column("Original Size", style="magenta")
-    results_table.add_column("Compressed Size", style="green")
-    results_table.add_column("Ratio", style="blue")
-    results_table.add_column("Savings", style="yellow")
+        recent_rows = deque(maxlen=RECENT_ROWS)
 
-    progress = Progress(
-        TextColumn("[bold blue]{task.description}"),
-        BarColumn(bar_width=None),
-        "[progress.percentage]{task.percentage:>3.0f}%",
-        TimeRemainingColumn(),
-    )
-    task_id = progress.add_task("Compressing...", total=total_files)
+        progress = Progress(
+            TextColumn("[bold blue]{task.description}"),
+            BarColumn(bar_width=None),
+            "[progress.percentage]{task.percentage:>3.0f}%",
+            TimeRemainingColumn(),
+        )
+        task_id = progress.add_task("Compressing...", total=total_files)
 
-    layout = make_layout()
-    layout["header"].update(Panel(progress, title="Overall Progress", border_style="green"))
-    layout["body"].update(results_table)
+        layout = make_layout()
+        layout["header"].update(Panel(progress, title="Overall Progress", border_style="green"))
+        layout["body"].update(make_results_table(recent_rows))
 
-    total_original_size = 0
-    total_compressed_size = 0
+        total_original_size = 0
+        total_compressed_size = 0
 
-    start_time = time.time()
+        start_time = time.time()
 
-    with Live(layout, console=console, screen=True, redirect_stderr=False) as live:
-        for filename in files_to_process:
-            input_path = os.path.join(input_dir, filename)
-            output_path = os.path.join(output_dir, filename)
+        # Finished jobs arrive here so Live is only touched from this thread
+        events = queue.Queue()
+        stats_lock = threading.Lock()
+        latest_stats = {}
+        shown_stats = {}
+        layout["side"].update(make_stats_panel({}))
+        stats_thread = threading.Thread(target=sample_stats, args=(handle, latest_stats, stats_lock, stop_event), daemon=True)
 
-            original_size = get_file_size(input_path)
+        log_path = os.path.join(output_dir, 'compression_log.csv')
 
-            command = []
-            if filename.lower().endswith('.mp4'):
-                command = [
-                    'ffmpeg', '-y', '-i', input_path, '-r', '24', '-c:v', 'h264_nvenc',
-                    '-preset', 'slow', '-rc', 'vbr', '-cq', '32', '-c:a', 'copy', output_path
-                ]
-            elif filename.lower().endswith('.jpg'):
-                command = ['ffmpeg', '-y', '-i', input_path, '-q:v', '8', output_path]
-            else:
-                progress.update(task_id, advance=1)
-                continue
+        with Live(layout, console=console, screen=True, redirect_stderr=False) as live, \
+                ThreadPoolExecutor(max_workers=max_sessions) as executor, \
+                open(log_path, 'w', newline='') as log_file:
+            # On Ctrl-C or an error, drop the queued jobs: the executor's __exit__ would otherwise
+            # run every remaining encode (with no UI) before the exception got anywhere
+            try:
+                log_writer = csv.writer(log_file)
+                log_writer.writerow(["filename", "original_bytes", "compressed_bytes", "ratio", "savings_bytes"])
+                stats_thread.start()
+                pending = 0
+                jobs = []
+                for filename in files_to_process:
+                    input_path = os.path.join(input_dir, filename)
+                    output_path = os.path.join(output_dir, filename)
+                    command = build_command(filename, input_path, output_path)
+                    if command is None:
+                        progress.update(task_id, advance=1)
+                        continue
+                    jobs.append((filename, command, input_path, output_path))
+                original_sizes = batch_file_sizes(job[2] for job in jobs)
+                # Identical inputs are encoded once; the copies get a hardlink to that output
+                duplicates = find_duplicates([job[2] for job in jobs], original_sizes)
+                output_by_input = {job[2]: job[3] for job in jobs}
+                duplicates_of = {}
+                for filename, command, input_path, output_path in jobs:
+                    if input_path in duplicates:
+                        duplicates_of.setdefault(os.path.basename(duplicates[input_path]), []).append(
+                            (filename, output_path, output_by_input[duplicates[input_path]])
+                        )
+                        continue
+                    fut = executor.submit(run_job, filename, command, original_sizes[input_path], output_path)
+                    fut.add_done_callback(events.put)
+                    pending += 1
+
+                while pending:
+                    try:
+                        fut = events.get(timeout=0.1)
+                    except queue.Empty:
+                        fut = None
+                    with stats_lock:
+                        snapshot = dict(latest_stats)
+                    if snapshot and snapshot != shown_stats:
+                        # Only rebuilt when a value changed, and swapped in with a single update()
+                        layout["side"].update(make_stats_panel(snapshot))
+                        shown_stats = snapshot
+                    if fut is None:
+                        continue
+
+                    pending -= 1
+                    filename, original_size, compressed_size = fut.result()
+                    finished = [(filename, compressed_size)]
+                    for dup_name, dup_output, primary_output in duplicates_of.pop(filename, []):
+                        # A failed primary encode leaves nothing to link: the copies are reported
+                        # as failed with it instead of the exception aborting the whole run
+                        dup_size = 0
+                        if compressed_size > 0 and os.path.exists(primary_output):
+                            try:
+                                link_or_copy(primary_output, dup_output)
+                                dup_size = compressed_size
+                            except OSError:
+                                pass
+                        finished.append((dup_name, dup_size))
+
+                    for filename, compressed_size in finished:
+                        total_original_size += original_size
+                        total_compressed_size += compressed_size
+                        compression_ratio = original_size / compressed_size if compressed_size > 0 else 0
+                        savings = original_size - compressed_size
+                        log_writer.writerow([filename, original_size, compressed_size, f"{compression_ratio:.4f}", savings])
+                        recent_rows.append((
+                            filename,
+                            format_size(original_size),
+                            format_size(compressed_size),
+                            f"{compression_ratio:.2f}x",
+                            format_size(savings)
+                        ))
+                        progress.update(task_id, advance=1)
+                    layout["body"].update(make_results_table(recent_rows))
+
+                    total_ratio = total_original_size / total_compressed_size if total_compressed_size > 0 else 0
+                    total_savings = total_original_size - total_compressed_size
+                    total_stats_panel = Panel(
+                        f"Total Saved: {format_size(total_savings)}\nOverall Ratio: {total_ratio:.2f}x",
+                        title="Total Stats", border_style="magenta"
+                    )
+                    layout["footer"].update(total_stats_panel)
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+        stop_event.set()
+        stats_thread.join()
 
-            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            
-            layout["header"].update(Panel(f"Compressing: {filename}", title="Current File", border_style="yellow"))
-
-            while process.poll() is None:
-                # Update system stats
-                cpu_usage = psutil.cpu_percent()
-                cpu_temp = psutil.sensors_temperatures().get('coretemp', [None])[0]
-                cpu_temp_str = f"{cpu_temp.current}°C" if cpu_temp else "N/A"
-                gpu_util = nvmlDeviceGetUtilizationRates(handle)
-                gpu_mem = nvmlDeviceGetMemoryInfo(handle)
-                gpu_temp = nvmlDeviceGetTemperature(handle, NVML_TEMPERATURE_GPU)
-                power_usage = nvmlDeviceGetPowerUsage(handle) / 1000.0 # In Watts
-
-                stats_table = Table(title="System Stats")
-                stats_table.add_column("Metric", style="bold")
-                stats_table.add_column("Value")
-                stats_table.add_row("CPU Usage", f"{cpu_usage}%")
-                stats_table.add_row("CPU Temp", cpu_temp_str)
-                stats_table.add_row("GPU Usage", f"{gpu_util.gpu}%")
-                stats_table.add_row("GPU Temp", f"{gpu_temp}°C")
-                stats_table.add_row("GPU RAM", f"{gpu_mem.used / gpu_mem.total * 100:.2f}% ({format_size(gpu_mem.used)})")
-                stats_table.add_row("GPU Power", f"{power_usage:.2f}W")
-                layout["side"].update(Panel(stats_table, title="Live Stats", border_style="blue"))
-                time.sleep(0.5)
-
-            compressed_size = get_file_size(output_path)
-            total_original_size += original_size
-            total_compressed_size += compressed_size
-            compression_ratio = original_size / compressed_size if compressed_size > 0 else 0
-            savings = original_size - compressed_size
-            results_table.add_row(
-                filename,
-                format_size(original_size),
-                format_size(compressed_size),
-                f"{compression_ratio:.2f}x",
-                format_size(savings)
-            )
-
-            total_ratio = total_original_size / total_compressed_size if total_compressed_size > 0 else 0
-            total_savings = total_original_size - total_compressed_size
-            total_stats_panel = Panel(
-                f"Total Saved: {format_size(total_savings)}\nOverall Ratio: {total_ratio:.2f}x",
-                title="Total Stats", border_style="magenta"
-            )
-            layout["footer"].update(total_stats_panel)
-
-            progress.update(task_id, advance=1)
-
-    total_time = time.time() - start_time
-    console.print(Panel(f"Total compression time: {total_time:.2f} seconds for {total_files} files.", title="[bold green]Complete[/bold green]"))
-    console.print("Press 'x' and Enter to exit.")
-    while input() != 'x':
-        pass
-
-    nvmlShutdown()
+        total_time = time.time() - start_time
+        console.print(Panel(f"Total compression time: {total_time:.2f} seconds for {total_files} files.", title="[bold green]Complete[/bold green]"))
+        if interactive:
+            console.print("Press 'x' and Enter to exit.")
+            while input() != 'x':
+                pass
+    finally:
+        stop_event.set()
+        if stats_thread is not None and stats_thread.is_alive():
+            stats_thread.join()
+        nvmlShutdown()
 
 def main():
+    parser = argparse.ArgumentParser(description="Compress .mp4/.jpg files with NVENC.")
+    parser.add_argument('--interactive', action='store_true', help="Wait for 'x' + Enter before exiting")
+    args = parser.parse_args()
     input_directory = '/home/rishi/Desktop/mummy/test'
     output_directory = '/home/rishi/Desktop/mummy/test_compressed'
-    compress_media(input_directory, output_directory)
+    compress_media(input_directory, output_directory, interactive=args.interactive)
 
 if __name__ == "__main__":
     main()
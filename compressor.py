@@ -3,9 +3,29 @@ import subprocess
 import os
 import time
 import shutil
+import json
+from collections import namedtuple
+import tempfile
+import functools
+import bisect
+import selectors
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import PyNvVideoCodec as nvc
+except ImportError:
+    nvc = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
 VIDEO_EXTS = {'.mp4', '.mov', '.mkv', '.avi', '.webm'}
 IMAGE_EXTS = {'.jpg', '.jpeg', '.png'}
+JPEG_EXTS = {'.jpg', '.jpeg'}
+JPEG_QUALITY = 75
 
 def _run_ffmpeg(cmd):
     start = time.time()
@@ -27,61 +47,148 @@ def _parse_fps(s: str) -> float | None:
     except Exception:
         return None
 
+@functools.lru_cache(maxsize=4096)
+def _probe_cached(path: str, mtime: float) -> dict:
+    # mtime is part of the cache key so a rewritten file is probed again
+    out = subprocess.check_output([
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=duration:stream=codec_type,codec_name,width,height,pix_fmt,color_transfer,'
+                         'duration,nb_frames,avg_frame_rate,sample_rate,channels,channel_layout:stream_tags=rotate',
+        '-of', 'json', path
+    ], text=True)
+    info = json.loads(out or '{}')
+    streams = info.get('streams') or []
+    # Keep only the first video stream under 'streams' and the first audio stream under 'audio'
+    video = next((st for st in streams if st.get('codec_type') == 'video'), None)
+    info['streams'] = [video] if video else []
+    info['audio'] = next((st for st in streams if st.get('codec_type') == 'audio'), None)
+    return info
+
+def probe_media(path: str) -> dict:
+    """Return ffprobe's format/first-video-stream/first-audio-stream info for path from a single,
+    cached ffprobe call."""
+    try:
+        return _probe_cached(path, os.path.getmtime(path))
+    except Exception:
+        return {}
+
+def _positive_float(val) -> float | None:
+    try:
+        f = float(val)
+        return f if f > 0 else None
+    except (TypeError, ValueError):
+        return None
+
 def get_video_rotate_tag(path: str) -> str | None:
     """Return the 'rotate' tag value from the first video stream if present (e.g., '90', '180')."""
+    streams = probe_media(path).get('streams') or [{}]
+    out = (streams[0].get('tags') or {}).get('rotate')
+    if out and str(out).upper() != 'N/A':
+        return str(out)
+    return None
+
+def get_video_codec(path: str) -> str | None:
+    """Return the codec name of the first video stream (e.g., 'h264', 'hevc')."""
+    streams = probe_media(path).get('streams') or [{}]
+    return streams[0].get('codec_name')
+
+def get_video_shape(path: str) -> tuple:
+    """Return (width, height, fps) of the first video stream; unknown fields are None."""
+    stream = (probe_media(path).get('streams') or [{}])[0]
+    return stream.get('width'), stream.get('height'), _parse_fps(stream.get('avg_frame_rate') or '')
+
+@functools.lru_cache(maxsize=None)
+def _ffmpeg_codec_list(flag: str) -> frozenset:
+    """Names listed by 'ffmpeg -decoders' / '-encoders' for this build; probed once per process."""
     try:
-        out = subprocess.check_output([
-            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-            '-show_entries', 'stream_tags=rotate', '-of', 'default=nw=1:nk=1', path
-        ], text=True).strip()
-        if out and out.upper() != 'N/A':
-            return out
+        out = subprocess.check_output(['ffmpeg', '-hide_banner', flag], text=True)
     except Exception:
-        pass
-    return None
+        return frozenset()
+    names = set()
+    listing = out.split('------', 1)[-1]
+    for line in listing.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            names.add(parts[1])
+    return frozenset(names)
+
+def _ffmpeg_decoders() -> frozenset:
+    return _ffmpeg_codec_list('-decoders')
+
+# Best compression first; each GPU generation supports a prefix of this list
+NVENC_PREFERENCE = ('av1_nvenc', 'hevc_nvenc', 'h264_nvenc')
+# CQ giving roughly equal visual quality per encoder (HEVC/AV1 need a lower CQ than H264 34)
+NVENC_CQ = {'av1_nvenc': 30, 'hevc_nvenc': 30, 'h264_nvenc': 34}
+# Containers that cannot carry every codec in NVENC_PREFERENCE
+_CONTAINER_ENCODERS = {'.webm': ('av1_nvenc',), '.avi': ('h264_nvenc',)}
+# encoder -> usable on this machine; filled lazily, once per encoder
+_nvenc_usable = {}
+_nvenc_lock = threading.Lock()
+
+def _nvenc_works(encoder: str) -> bool:
+    """ffmpeg may list an NVENC encoder the GPU cannot run (e.g. AV1 before Ada), so try a tiny encode."""
+    with _nvenc_lock:
+        if encoder not in _nvenc_usable:
+            ok = encoder in _ffmpeg_codec_list('-encoders')
+            if ok:
+                ok, _, _ = _run_ffmpeg([
+                    'ffmpeg', '-hide_banner', '-loglevel', 'error',
+                    '-f', 'lavfi', '-i', 'color=size=256x256:rate=24:duration=0.1',
+                    '-c:v', encoder, '-f', 'null', '-'
+                ])
+            _nvenc_usable[encoder] = ok
+        return _nvenc_usable[encoder]
+
+def get_nvenc_encoder(output_path: str) -> str:
+    """Pick the most efficient working NVENC encoder the output container can hold, else h264_nvenc."""
+    ext = os.path.splitext(output_path)[1].lower()
+    for encoder in _CONTAINER_ENCODERS.get(ext, NVENC_PREFERENCE):
+        if _nvenc_works(encoder):
+            return encoder
+    return 'h264_nvenc'
+
+def _nvenc_args(encoder: str, output_path: str, cq: int | None = None) -> list:
+    args = ['-c:v', encoder, '-preset', 'p1', '-rc', 'vbr', '-cq', str(cq if cq is not None else NVENC_CQ.get(encoder, 34))]
+    if encoder == 'hevc_nvenc' and os.path.splitext(output_path)[1].lower() in ('.mp4', '.mov'):
+        # hvc1 tag so Apple/QuickTime players accept HEVC in MP4
+        args += ['-tag:v', 'hvc1']
+    return args
+
+def _cuvid_decoder(codec_name: str | None) -> str | None:
+    """Return the NVDEC (cuvid) decoder for codec_name if ffmpeg has one, e.g. 'h264_cuvid'."""
+    if not codec_name:
+        return None
+    name = f'{codec_name}_cuvid'
+    return name if name in _ffmpeg_decoders() else None
 
 def get_media_duration_seconds(path: str) -> float | None:
-    # 1) Try container (format) duration
+    """Duration of path in seconds, or None; memoized per (path, mtime) like probe_media.
+    The last resort decodes the whole file, so a file without duration metadata must not pay it
+    again in every caller (probe_many, group_for_batch, is_already_compressed).
+    """
     try:
-        out = subprocess.check_output([
-            'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-            '-of', 'default=nw=1:nk=1', path
-        ], text=True).strip()
-        if out:
-            val = float(out)
-            if val > 0:
-                return val
-    except Exception:
-        pass
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    return _duration_cached(path, mtime)
+
+@functools.lru_cache(maxsize=4096)
+def _duration_cached(path: str, mtime: float) -> float | None:
+    info = probe_media(path)
+    stream = (info.get('streams') or [{}])[0]
+    # 1) Try container (format) duration
+    val = _positive_float((info.get('format') or {}).get('duration'))
+    if val:
+        return val
     # 2) Try first video stream's duration
-    try:
-        out = subprocess.check_output([
-            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-            '-show_entries', 'stream=duration', '-of', 'default=nw=1:nk=1', path
-        ], text=True).strip()
-        if out:
-            val = float(out)
-            if val > 0:
-                return val
-    except Exception:
-        pass
+    val = _positive_float(stream.get('duration'))
+    if val:
+        return val
     # 3) Compute via nb_frames / avg_frame_rate
-    try:
-        nb_frames = subprocess.check_output([
-            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-            '-show_entries', 'stream=nb_frames', '-of', 'default=nw=1:nk=1', path
-        ], text=True).strip()
-        fps = subprocess.check_output([
-            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-            '-show_entries', 'stream=avg_frame_rate', '-of', 'default=nw=1:nk=1', path
-        ], text=True).strip()
-        if nb_frames and nb_frames != 'N/A' and fps:
-            n = float(nb_frames)
-            r = _parse_fps(fps)
-            if r and r > 0 and n > 0:
-                return n / r
-    except Exception:
-        pass
+    n = _positive_float(stream.get('nb_frames'))
+    r = _parse_fps(stream.get('avg_frame_rate') or '')
+    if n and r and r > 0:
+        return n / r
     # 4) Fallback: count frames (slower) to estimate duration when nb_frames missing
     try:
         nb_read_frames = subprocess.check_output([
@@ -97,79 +204,185 @@ def get_media_duration_seconds(path: str) -> float | None:
         pass
     return None
 
+def probe_many(paths, max_workers: int | None = None) -> dict:
+    """Probe many files concurrently so ffprobe start-up overlaps across cores.
+    Returns {path: (duration_s, rotate_tag)}; results also land in the probe_media cache.
+    """
+    paths = list(paths)
+    if not paths:
+        return {}
+    def _probe(path):
+        return get_media_duration_seconds(path), get_video_rotate_tag(path)
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 2) as ex:
+        return dict(zip(paths, ex.map(_probe, paths)))
+
+def _last_value(block: bytes, key: bytes) -> bytes | None:
+    """Return the value of the last 'key' line (key includes '=') in block, or None."""
+    end = len(block)
+    while True:
+        i = block.rfind(key, 0, end)
+        if i < 0:
+            return None
+        # Only accept matches at the start of a line
+        if i == 0 or block[i - 1] == 0x0A:
+            j = block.find(b'\n', i)
+            return block[i + len(key):j if j >= 0 else len(block)].strip()
+        end = i
+
+class _ProgressParser:
+    """Turns ffmpeg -progress key=value byte lines into progress_cb(percent, speed_x, out_time_s) calls."""
+
+    def __init__(self, duration_s: float | None, progress_cb=None):
+        self.duration_s = duration_s
+        self.progress_cb = progress_cb
+        self.percent = 0.0
+
+    def _emit(self, percent, speed_x, out_s):
+        if self.progress_cb:
+            try:
+                self.progress_cb(percent, speed_x, out_s)
+            except Exception:
+                pass
+
+    def _emit_time(self, out_s: float):
+        if self.duration_s and self.duration_s > 0:
+            self.percent = max(0.0, min(100.0, (out_s / self.duration_s) * 100.0))
+        else:
+            self.percent = 0.0
+        self._emit(self.percent, None, out_s)
+
+    def feed(self, block: bytes):
+        """Consume one or more complete key=value lines.
+        Only the latest value of each key matters, so the block is searched from the end with
+        bytes.rfind (C speed) instead of splitting and looping over every line in Python.
+        """
+        val = _last_value(block, b'out_time_us=') or _last_value(block, b'out_time_ms=')
+        if val:
+            try:
+                self._emit_time(int(val) / 1_000_000.0)
+            except ValueError:
+                pass
+        else:
+            val = _last_value(block, b'out_time=')
+            if val:
+                # format HH:MM:SS.micro
+                try:
+                    h, m, s = val.split(b':')
+                    self._emit_time(int(h) * 3600 + int(m) * 60 + float(s))
+                except Exception:
+                    pass
+        val = _last_value(block, b'speed=')
+        if val is not None:
+            # e.g., 2.34x
+            try:
+                spx = float(val[:-1]) if val.endswith(b'x') else None
+            except Exception:
+                spx = None
+            self._emit(self.percent, spx, None)
+        if _last_value(block, b'progress=') == b'end':
+            # Emit 100% on end if duration known, otherwise force 100%
+            self._emit(100.0, None, None)
+
+
+class _ProgressPoller:
+    """One background thread that multiplexes stdout/stderr of every running ffmpeg via a selector.
+
+    Each child's stdout is parsed as -progress output and its stderr is collected for the error log,
+    so N concurrent encoders cost one parsing thread instead of N blocked readers.
+    """
+
+    def __init__(self):
+        self._sel = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._thread = None
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        self._sel.register(self._wake_r, selectors.EVENT_READ, None)
+
+    def watch(self, proc, parser: _ProgressParser) -> dict:
+        """Start servicing proc's pipes. Returns a job dict whose 'done' event fires at EOF on both."""
+        job = {'pid': proc.pid, 'parser': parser, 'buf': b'', 'stderr': [], 'open': 0, 'done': threading.Event()}
+        with self._lock:
+            self._pending.append((proc, job))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='ffmpeg-progress', daemon=True)
+                self._thread.start()
+        os.write(self._wake_w, b'x')
+        return job
+
+    def _register_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for proc, job in pending:
+            for stream, kind in ((proc.stdout, 'out'), (proc.stderr, 'err')):
+                if stream is None:
+                    continue
+                os.set_blocking(stream.fileno(), False)
+                self._sel.register(stream, selectors.EVENT_READ, (job, kind))
+                job['open'] += 1
+            if job['open'] == 0:
+                job['done'].set()
+
+    def _loop(self):
+        while True:
+            for key, _ in self._sel.select():
+                if key.data is None:
+                    try:
+                        os.read(self._wake_r, 4096)
+                    except BlockingIOError:
+                        pass
+                    self._register_pending()
+                    continue
+                job, kind = key.data
+                try:
+                    chunk = os.read(key.fd, 65536)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    chunk = b''
+                if not chunk:
+                    self._sel.unregister(key.fileobj)
+                    if kind == 'out' and job['buf']:
+                        job['parser'].feed(job['buf'])
+                        job['buf'] = b''
+                    job['open'] -= 1
+                    if job['open'] == 0:
+                        job['done'].set()
+                    continue
+                if kind == 'err':
+                    job['stderr'].append(chunk)
+                    continue
+                # Parse all complete lines at once and keep the trailing partial line for the next read
+                data = job['buf'] + chunk
+                cut = data.rfind(b'\n')
+                if cut < 0:
+                    job['buf'] = data
+                    continue
+                job['buf'] = data[cut + 1:]
+                job['parser'].feed(data[:cut])
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+def _get_poller() -> _ProgressPoller:
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = _ProgressPoller()
+        return _poller
+
 def _run_ffmpeg_with_progress(cmd, duration_s: float | None, progress_cb=None):
     """Run ffmpeg and parse -progress pipe:1 output. Calls progress_cb(percent, speed_x, out_time_s)."""
     start = time.time()
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
-    percent = 0.0
+    parser = _ProgressParser(duration_s, progress_cb)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     # Emit an initial progress tick so UI doesn't show --%
-    if progress_cb:
-        try:
-            progress_cb(0.0, None, 0.0)
-        except Exception:
-            pass
+    parser._emit(0.0, None, 0.0)
+    job = _get_poller().watch(proc, parser)
     try:
-        if proc.stdout is not None:
-            for line in proc.stdout:
-                line = line.strip()
-                if not line:
-                    continue
-                # Expect key=value lines
-                if '=' not in line:
-                    continue
-                key, val = line.split('=', 1)
-                if key == 'out_time_ms':
-                    try:
-                        out_ms = int(val)
-                        out_s = out_ms / 1_000_000.0
-                        if duration_s and duration_s > 0:
-                            percent = max(0.0, min(100.0, (out_s / duration_s) * 100.0))
-                        else:
-                            percent = 0.0
-                        if progress_cb:
-                            progress_cb(percent, None, out_s)
-                    except ValueError:
-                        pass
-                elif key == 'out_time_us':
-                    try:
-                        out_us = int(val)
-                        out_s = out_us / 1_000_000.0
-                        if duration_s and duration_s > 0:
-                            percent = max(0.0, min(100.0, (out_s / duration_s) * 100.0))
-                        else:
-                            percent = 0.0
-                        if progress_cb:
-                            progress_cb(percent, None, out_s)
-                    except ValueError:
-                        pass
-                elif key == 'out_time':
-                    # format HH:MM:SS.micro
-                    try:
-                        h, m, s = val.split(':')
-                        out_s = int(h) * 3600 + int(m) * 60 + float(s)
-                        if duration_s and duration_s > 0:
-                            percent = max(0.0, min(100.0, (out_s / duration_s) * 100.0))
-                        else:
-                            percent = 0.0
-                        if progress_cb:
-                            progress_cb(percent, None, out_s)
-                    except Exception:
-                        pass
-                elif key == 'speed':
-                    # e.g., 2.34x
-                    if progress_cb:
-                        try:
-                            spx = float(val.replace('x', '')) if val.endswith('x') else None
-                        except Exception:
-                            spx = None
-                        progress_cb(percent, spx, None)
-                elif key == 'progress' and val == 'end':
-                    # Emit 100% on end if duration known, otherwise force 100%
-                    if progress_cb:
-                        try:
-                            progress_cb(100.0, None, None)
-                        except Exception:
-                            pass
+        job['done'].wait()
         proc.wait()
     finally:
         try:
@@ -182,101 +395,357 @@ def _run_ffmpeg_with_progress(cmd, duration_s: float | None, progress_cb=None):
             pass
     end = time.time()
     ok = proc.returncode == 0
-    # We cannot capture stderr once closed; recommend returning empty here
-    return ok, (end - start), ''
+    return ok, (end - start), b''.join(job['stderr']).decode('utf-8', 'replace').strip()
 
-def compress_file(input_path, output_path, *, progress_cb=None, duration_s: float | None = None):
-    """Compress a file using ffmpeg.
-    - Videos: use h264_nvenc for GPU encoding, VBR, preset slow.
-    - Images: attempt mjpeg_nvenc (GPU). If not available, fallback to CPU mjpeg.
-    Returns: dict with {'type','duration_sec','error','error_log'}
+# PyNvVideoCodec codec name and raw elementary-stream demuxer for each NVENC encoder
+_PYNVC_CODECS = {'h264_nvenc': ('h264', 'h264'), 'hevc_nvenc': ('hevc', 'hevc'), 'av1_nvenc': ('av1', 'obu')}
+# 8-bit 4:2:0 inputs, i.e. what the NV12 surfaces of the PyNvVideoCodec path hold without loss
+_PYNVC_PIX_FMTS = {'yuv420p', 'yuvj420p', 'nv12'}
+# Output frame rate of every video attempt ('-r 24' in build_cmd)
+OUTPUT_FPS = 24.0
+
+def pynvc_suitable(input_path: str) -> bool:
+    """True if compress_video_pynvc would produce what the ffmpeg attempts (build_cmd) do.
+    It has no scaler and only NV12 surfaces, so HDR/10-bit inputs and inputs above the
+    short-side cap are left to the ffmpeg attempts.
     """
-    ext = os.path.splitext(input_path)[1].lower()
-    filename = os.path.basename(input_path)
+    stream = (probe_media(input_path).get('streams') or [{}])[0]
+    width, height = stream.get('width'), stream.get('height')
+    return (
+        not _is_hdr(stream)
+        and stream.get('pix_fmt') in _PYNVC_PIX_FMTS
+        and bool(width and height) and min(width, height) <= SHORT_SIDE_CAP
+    )
 
-    # Ensure output directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+def compress_video_pynvc(input_path: str, output_path: str, cq: int | None = None, *, rotate_tag: str | None = None,
+                         duration_s: float | None = None, progress_cb=None):
+    """Decode with NVDEC and encode with NVENC via PyNvVideoCodec, keeping frames in VRAM.
+    Uses the same encoder as the ffmpeg attempts (get_nvenc_encoder) and drops frames down to
+    OUTPUT_FPS; check pynvc_suitable() first. ffmpeg is only used to mux the encoded elementary
+    stream with the source audio.
+    Returns (ok, elapsed_s, error_text) like _run_ffmpeg.
+    """
+    if nvc is None:
+        return False, 0.0, 'PyNvVideoCodec not available'
+    start = time.time()
+    encoder_name = get_nvenc_encoder(output_path)
+    codec, es_format = _PYNVC_CODECS[encoder_name]
+    es_path = output_path + '.' + codec
+    try:
+        demuxer = nvc.CreateDemuxer(filename=input_path)
+        decoder = nvc.CreateDecoder(gpuid=0, codec=demuxer.GetNvCodecId(), cudacontext=0, cudastream=0, usedevicememory=True)
+        encoder = nvc.CreateEncoder(
+            demuxer.Width(), demuxer.Height(), 'NV12', False,
+            codec=codec, preset='P1', tuning_info='high_quality', rc='vbr',
+            cq=cq if cq is not None else NVENC_CQ.get(encoder_name, 34),
+        )
+        in_fps = demuxer.FrameRate() or OUTPUT_FPS
+        fps = min(in_fps, OUTPUT_FPS)
+        decoded = 0
+        frames = 0
+        if progress_cb:
+            progress_cb(0.0, None, 0.0)
+        with open(es_path, 'wb') as es:
+            for packet in demuxer:
+                for frame in decoder.Decode(packet):
+                    # Keep a frame whenever the output clock has caught up with the input clock
+                    decoded += 1
+                    if frames < decoded * fps / in_fps:
+                        es.write(bytearray(encoder.Encode(frame)))
+                        frames += 1
+                if progress_cb and frames:
+                    out_s = frames / fps
+                    percent = max(0.0, min(100.0, (out_s / duration_s) * 100.0)) if duration_s and duration_s > 0 else 0.0
+                    progress_cb(percent, None, out_s)
+            es.write(bytearray(encoder.EndEncode()))
+    except Exception as e:
+        try:
+            os.remove(es_path)
+        except OSError:
+            pass
+        return False, (time.time() - start), str(e)
 
-    if ext in VIDEO_EXTS:
-        rotate_tag = get_video_rotate_tag(input_path)
-        # Try 1: NVENC with CUDA hwaccel (device decode + encode)
-        base1 = [
-            '-hwaccel', 'cuda',
-            '-hwaccel_output_format', 'cuda',
-            '-i', input_path,
-            '-r', '24',  # frame limiting
-            '-c:v', 'h264_nvenc',
-            '-preset', 'p1',  # fastest NVENC preset for throughput
-            '-rc', 'vbr',
-            '-cq', '34',  # increase compression (higher CQ -> smaller size)
-            '-c:a', 'copy',
-            # Preserve metadata and orientation tags; optimize MP4 for playback
-            '-map_metadata', '0', '-movflags', 'use_metadata_tags+faststart',
-            *( ['-metadata:s:v:0', f'rotate={rotate_tag}'] if rotate_tag else [] ),
-            output_path
-        ]
-        if progress_cb is not None:
-            cmd1 = ['ffmpeg', '-y', '-hide_banner', '-nostats', '-loglevel', 'error', '-progress', 'pipe:1', *base1]
-        else:
-            cmd1 = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', *base1]
-        if progress_cb is not None:
-            ok, dur, err = _run_ffmpeg_with_progress(cmd1, duration_s, progress_cb)
-        else:
-            ok, dur, err = _run_ffmpeg(cmd1)
-        if ok:
-            return {'type': 'video-gpu', 'duration_sec': dur, 'error': None, 'error_log': ''}
+    # Mux the new video stream with the original audio and metadata
+    mux_cmd = [
+        'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', es_format, '-r', f'{fps}', '-i', es_path,
+        '-i', input_path,
+        '-map', '0:v:0', '-map', '1:a?',
+        '-c:v', 'copy', '-c:a', 'copy',
+        *( ['-tag:v', 'hvc1'] if codec == 'hevc' and os.path.splitext(output_path)[1].lower() in ('.mp4', '.mov') else [] ),
+        '-map_metadata', '1', '-movflags', 'use_metadata_tags+faststart',
+        *( ['-metadata:s:v:0', f'rotate={rotate_tag}'] if rotate_tag else [] ),
+        output_path
+    ]
+    ok, _, err = _run_ffmpeg(mux_cmd)
+    try:
+        os.remove(es_path)
+    except OSError:
+        pass
+    if ok and progress_cb:
+        progress_cb(100.0, None, None)
+    return ok, (time.time() - start), err
 
-        # Try 2: NVENC without enforcing CUDA hwaccel (software decode, GPU encode)
-        base2 = [
-            '-i', input_path,
+# Videos below this bitrate (or already HEVC/AV1) are passed through instead of re-encoded
+SKIP_THRESHOLD_BPS = 2_000_000
+_EFFICIENT_CODECS = {'hevc', 'av1'}
+
+def is_already_compressed(path: str, duration_s: float | None = None, threshold_bps: float = SKIP_THRESHOLD_BPS) -> bool:
+    """True if re-encoding path would likely waste GPU time: it is HEVC/AV1 or under threshold_bps."""
+    if get_video_codec(path) in _EFFICIENT_CODECS:
+        return True
+    duration_s = duration_s or get_media_duration_seconds(path)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return False
+    return bool(duration_s) and (size * 8 / duration_s) < threshold_bps
+
+def _pass_through(input_path: str, output_path: str):
+    """Hardlink the source to the output (same filesystem), else copy it."""
+    try:
+        if os.path.lexists(output_path):
+            os.remove(output_path)
+        os.link(input_path, output_path)
+    except OSError:
+        shutil.copy2(input_path, output_path)
+
+def compress_jpeg_pil(input_path: str, output_path: str, quality: int = JPEG_QUALITY):
+    """Re-encode a JPEG in-process with Pillow (libjpeg-turbo), keeping EXIF and the ICC profile.
+    Returns (ok, elapsed_s, error_text) like _run_ffmpeg.
+    """
+    if Image is None:
+        return False, 0.0, 'Pillow not available'
+    start = time.time()
+    try:
+        with Image.open(input_path) as img:
+            # Wide-gamut (e.g. Display P3) photos look wrong without their colour profile
+            extra = {key: img.info[key] for key in ('exif', 'icc_profile') if img.info.get(key)}
+            img.save(output_path, 'JPEG', quality=quality, optimize=True, progressive=True, **extra)
+    except Exception as e:
+        return False, (time.time() - start), str(e)
+    return True, (time.time() - start), ''
+
+def rendition_path(output_path: str, height: int) -> str:
+    """Output path for one rendition, e.g. out.mp4 -> out_720p.mp4."""
+    root, ext = os.path.splitext(output_path)
+    return f'{root}_{height}p{ext}'
+
+def _rendition_cmd(input_path: str, output_path: str, renditions, rotate_tag, progress: bool, hw: bool) -> list:
+    """One ffmpeg that decodes once, splits the frames and encodes every rendition on NVENC."""
+    n = len(renditions)
+    scale = 'scale_cuda' if hw else 'scale'
+    graph = f"[0:v]split={n}" + ''.join(f'[v{i}]' for i in range(n))
+    for i, (w, h, _) in enumerate(renditions):
+        graph += f"; [v{i}]{scale}={w}:{h}[o{i}]"
+    encoder = get_nvenc_encoder(output_path)
+    cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error']
+    if progress:
+        cmd += ['-nostats', '-progress', 'pipe:1']
+    if hw:
+        cmd += ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
+    cmd += ['-i', input_path, '-filter_complex', graph]
+    for i, (w, h, cq) in enumerate(renditions):
+        out = rendition_path(output_path, h)
+        cmd += [
+            '-map', f'[o{i}]', '-map', '0:a?',
             '-r', '24',
-            '-c:v', 'h264_nvenc',
-            '-preset', 'p1',
-            '-rc', 'vbr',
-            '-cq', '34',
+            *_nvenc_args(encoder, out, cq),
             '-c:a', 'copy',
             '-map_metadata', '0', '-movflags', 'use_metadata_tags+faststart',
             *( ['-metadata:s:v:0', f'rotate={rotate_tag}'] if rotate_tag else [] ),
-            output_path
+            out
         ]
+    return cmd
+
+def compress_renditions(input_path: str, output_path: str, renditions, *, rotate_tag=None,
+                        duration_s: float | None = None, progress_cb=None) -> dict:
+    """Produce several (width, height, cq) renditions from a single decode of input_path.
+    Outputs are written next to output_path via rendition_path(); returns a compress_file-style dict
+    with an extra 'outputs' list.
+    """
+    outputs = [rendition_path(output_path, h) for _, h, _ in renditions]
+    errors = []
+    # Try CUDA decode + scale_cuda first, then software decode/scale with NVENC encode
+    for hw, kind in ((True, 'video-renditions-gpu'), (False, 'video-renditions-swdec')):
+        cmd = _rendition_cmd(input_path, output_path, renditions, rotate_tag, progress_cb is not None, hw)
         if progress_cb is not None:
-            cmd2 = ['ffmpeg', '-y', '-hide_banner', '-nostats', '-loglevel', 'error', '-progress', 'pipe:1', *base2]
-        else:
-            cmd2 = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', *base2]
-        if progress_cb is not None:
-            ok2, dur2, err2 = _run_ffmpeg_with_progress(cmd2, duration_s, progress_cb)
+            ok, dur, err = _run_ffmpeg_with_progress(cmd, duration_s, progress_cb)
         else:
-            ok2, dur2, err2 = _run_ffmpeg(cmd2)
-        if ok2:
-            return {'type': 'video-gpu-swdec', 'duration_sec': dur2, 'error': None, 'error_log': ''}
+            ok, dur, err = _run_ffmpeg(cmd)
+        if ok:
+            return {'type': kind, 'duration_sec': dur, 'error': None, 'error_log': '', 'outputs': outputs}
+        if err:
+            errors.append(err)
+    return {'type': 'video-failed', 'duration_sec': 0.0, 'error': 'ffmpeg_failed',
+            'error_log': "\n".join(errors), 'outputs': []}
+
+# Placeholders in cached argv templates; render_cmd() swaps in the per-file values
+_IN, _OUT, _ROTATE = '\0input', '\0output', '\0rotate'
+
+# Everything about an input/attempt that changes the ffmpeg arguments (but not the file paths)
+EncodeProfile = namedtuple('EncodeProfile', 'attempt codec_in has_rotate resolution_bucket is_hdr out_ext progress')
+
+def _resolution_bucket(width, height) -> str:
+    if not width or not height:
+        return 'medium'
+    short_side = min(width, height)
+    if short_side < 480:
+        return 'small'
+    if short_side >= 1080:
+        return 'large'
+    return 'medium'
+
+# PQ (HDR10/Dolby Vision) and HLG transfer characteristics
+_HDR_TRANSFERS = {'smpte2084', 'arib-std-b67'}
+
+def _is_hdr(stream: dict) -> bool:
+    """True for PQ/HLG streams; untagged streams count if their pixel format is 10-bit."""
+    transfer = stream.get('color_transfer')
+    if transfer and transfer != 'unknown':
+        return transfer in _HDR_TRANSFERS
+    pix_fmt = stream.get('pix_fmt') or ''
+    return 'p10' in pix_fmt or 'p010' in pix_fmt  # e.g. yuv420p10le, p010le (not yuv410p)
+
+def get_encode_profile(input_path: str, output_path: str, attempt: str, rotate_tag, progress: bool) -> EncodeProfile:
+    stream = (probe_media(input_path).get('streams') or [{}])[0]
+    return EncodeProfile(
+        attempt=attempt,
+        codec_in=stream.get('codec_name'),
+        has_rotate=bool(rotate_tag),
+        resolution_bucket=_resolution_bucket(stream.get('width'), stream.get('height')),
+        is_hdr=_is_hdr(stream),
+        out_ext=os.path.splitext(output_path)[1].lower(),
+        progress=progress,
+    )
+
+# Outputs are capped at this many pixels on their short side (1080p landscape or portrait)
+SHORT_SIDE_CAP = 1080
+
+def _short_side_cap(scale: str) -> str:
+    """-vf value for scale/scale_cuda capping the short side at SHORT_SIDE_CAP, keeping aspect."""
+    cap = SHORT_SIDE_CAP
+    return (f"{scale}=w=if(lte(iw\\,ih)\\,min({cap}\\,iw)\\,-2)"
+            f":h=if(lte(iw\\,ih)\\,-2\\,min({cap}\\,ih))")
+
+@functools.lru_cache(maxsize=256)
+def build_cmd(profile: EncodeProfile) -> tuple:
+    """Build (once per profile) the ffmpeg argv for one attempt, with path/rotate placeholders.
+    attempt is 'gpu' (CUDA decode + NVENC), 'swdec' (software decode + NVENC) or 'cpu' (libx264).
+    """
+    if profile.progress:
+        head = ('ffmpeg', '-y', '-hide_banner', '-nostats', '-loglevel', 'error', '-progress', 'pipe:1')
+    else:
+        head = ('ffmpeg', '-y', '-hide_banner', '-loglevel', 'error')
+    # Preserve metadata and orientation tags; optimize MP4 for playback
+    tail = (
+        '-map_metadata', '0', '-movflags', 'use_metadata_tags+faststart',
+        *( ('-metadata:s:v:0', _ROTATE) if profile.has_rotate else () ),
+        _OUT,
+    )
+    if profile.attempt == 'cpu':
+        return (*head, '-i', _IN, '-vf', _short_side_cap('scale'), '-r', '24',
+                '-c:v', 'libx264', '-preset', 'medium', '-crf', '28',
+                '-c:a', 'aac', '-b:a', '128k', *tail)
+
+    # 10-bit (HDR) sources go to HEVC Main10 when the container allows it, keeping the extra bit depth
+    dummy_out = 'out' + profile.out_ext
+    hdr = profile.is_hdr and profile.out_ext not in _CONTAINER_ENCODERS and _nvenc_works('hevc_nvenc')
+    encoder = 'hevc_nvenc' if hdr else get_nvenc_encoder(dummy_out)
+    video = [*_nvenc_args(encoder, dummy_out)]
+    if hdr:
+        video += ['-profile:v', 'main10']
+    # Small inputs gain nothing from B-frames; large ones get a light B-frame/ref setup
+    if profile.resolution_bucket == 'small':
+        video += ['-bf', '0']
+    elif profile.resolution_bucket == 'large':
+        video += ['-bf', '2', '-refs', '1']
+
+    if profile.attempt == 'gpu':
+        cuvid = _cuvid_decoder(profile.codec_in)
+        decode = (
+            '-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda',
+            *( ('-c:v', cuvid) if cuvid else () ),
+            '-i', _IN,
+            '-vf', _short_side_cap('scale_cuda'),  # same cap as below, without a host round-trip
+        )
+    else:
+        decode = ('-i', _IN, '-vf', _short_side_cap('scale'), *( ('-pix_fmt', 'p010le') if hdr else () ))
+    return (*head, *decode, '-r', '24', *video, '-c:a', 'copy', *tail)
+
+def render_cmd(template: tuple, input_path: str, output_path: str, rotate_tag) -> list:
+    subst = {_IN: input_path, _OUT: output_path, _ROTATE: f'rotate={rotate_tag}'}
+    return [subst.get(arg, arg) for arg in template]
+
+# Sentinel for compress_file(rotate_tag=...): probe the file instead of trusting a caller-supplied value
+_PROBE = object()
+
+def compress_file(input_path, output_path, *, progress_cb=None, duration_s: float | None = None, rotate_tag=_PROBE,
+                  skip_threshold_bps: float | None = SKIP_THRESHOLD_BPS, renditions=None):
+    """Compress a file using ffmpeg.
+    - Videos: PyNvVideoCodec when installed, then the best working NVENC encoder (AV1/HEVC/H264), VBR, preset p1.
+    - Images: JPEGs via Pillow when installed, then mjpeg_nvenc (GPU). If not available, fallback to CPU mjpeg.
+    duration_s/rotate_tag may be passed from an earlier probe_many() to avoid probing again.
+    Videos that are already HEVC/AV1 or below skip_threshold_bps are hardlinked/copied as-is (None disables).
+    renditions=[(w, h, cq), ...] encodes several sizes from one decode instead (see compress_renditions).
+    Returns: dict with {'type','duration_sec','error','error_log'}
+    """
+    ext = os.path.splitext(input_path)[1].lower()
+    filename = os.path.basename(input_path)
 
+    # Ensure output directory exists
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    if ext in VIDEO_EXTS:
+        if rotate_tag is _PROBE:
+            rotate_tag = get_video_rotate_tag(input_path)
+        if renditions:
+            return compress_renditions(input_path, output_path, renditions, rotate_tag=rotate_tag,
+                                       duration_s=duration_s, progress_cb=progress_cb)
+        if skip_threshold_bps and is_already_compressed(input_path, duration_s, skip_threshold_bps):
+            try:
+                _pass_through(input_path, output_path)
+            except Exception as ce:
+                return {'type': 'video-failed', 'duration_sec': 0.0, 'error': 'copy_failed', 'error_log': str(ce)}
+            if progress_cb:
+                progress_cb(100.0, None, None)
+            return {'type': 'video-skip', 'duration_sec': 0.0, 'error': None, 'error_log': ''}
+        # Try 0: NVDEC -> NVENC entirely on the GPU via PyNvVideoCodec
+        err0 = ''
+        if nvc is not None and pynvc_suitable(input_path):
+            ok0, dur0, err0 = compress_video_pynvc(input_path, output_path, rotate_tag=rotate_tag,
+                                                     duration_s=duration_s, progress_cb=progress_cb)
+            if ok0:
+                return {'type': 'video-pynvc', 'duration_sec': dur0, 'error': None, 'error_log': ''}
+
+        # Try 1: NVENC with CUDA hwaccel (device decode + encode); scale_cuda keeps frames in VRAM
+        # Try 2: NVENC without enforcing CUDA hwaccel (software decode, GPU encode)
         # Try 3: CPU fallback with libx264 and re-encode audio to AAC
-        base3 = [
-            '-i', input_path,
-            '-r', '24',
-            '-c:v', 'libx264', '-preset', 'medium', '-crf', '28',
-            '-c:a', 'aac', '-b:a', '128k',
-            '-map_metadata', '0', '-movflags', 'use_metadata_tags+faststart',
-            *( ['-metadata:s:v:0', f'rotate={rotate_tag}'] if rotate_tag else [] ),
-            output_path
-        ]
-        if progress_cb is not None:
-            cmd3 = ['ffmpeg', '-y', '-hide_banner', '-nostats', '-loglevel', 'error', '-progress', 'pipe:1', *base3]
-            ok3, dur3, err3 = _run_ffmpeg_with_progress(cmd3, duration_s, progress_cb)
-        else:
-            cmd3 = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', *base3]
-            ok3, dur3, err3 = _run_ffmpeg(cmd3)
-        if ok3:
-            return {'type': 'video-cpu', 'duration_sec': dur3, 'error': None, 'error_log': ''}
+        errors = [err0]
+        for attempt, kind in (('gpu', 'video-gpu'), ('swdec', 'video-gpu-swdec'), ('cpu', 'video-cpu')):
+            profile = get_encode_profile(input_path, output_path, attempt, rotate_tag, progress_cb is not None)
+            cmd = render_cmd(build_cmd(profile), input_path, output_path, rotate_tag)
+            if progress_cb is not None:
+                ok, dur, err = _run_ffmpeg_with_progress(cmd, duration_s, progress_cb)
+            else:
+                ok, dur, err = _run_ffmpeg(cmd)
+            if ok:
+                return {'type': kind, 'duration_sec': dur, 'error': None, 'error_log': ''}
+            errors.append(err)
 
         # All attempts failed: copy original to output and log error
-        combined_err = "\n".join([msg for msg in [err, err2, err3] if msg])
+        combined_err = "\n".join([msg for msg in errors if msg])
         try:
             shutil.copy2(input_path, output_path)
         except Exception as ce:
             combined_err = (combined_err + f"\ncopy2 failed: {ce}").strip()
         return {'type': 'video-failed', 'duration_sec': 0.0, 'error': 'ffmpeg_failed', 'error_log': combined_err}
     elif ext in IMAGE_EXTS:
+        # JPEGs: encode in-process, avoiding an ffmpeg fork+exec per image
+        if ext in JPEG_EXTS and Image is not None:
+            ok, dur, err = compress_jpeg_pil(input_path, output_path)
+            if ok:
+                return {'type': 'image-pil', 'duration_sec': dur, 'error': None, 'error_log': ''}
         # Try GPU JPEG encoder first
         gpu_cmd = [
             'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
@@ -309,3 +778,176 @@ def compress_file(input_path, output_path, *, progress_cb=None, duration_s: floa
     else:
         # Unsupported type; skip
         return {'type': 'skip', 'duration_sec': 0.0, 'error': None, 'error_log': ''}
+
+
+# Containers the batch path writes (segment muxer format per extension); others are encoded per file
+_BATCH_FORMATS = {'.mp4': 'mp4', '.mov': 'mov'}
+
+def _batch_key(path: str, ext: str) -> tuple:
+    """Everything the concat demuxer and '-c:a copy' need to be identical across a batch."""
+    info = probe_media(path)
+    video = (info.get('streams') or [{}])[0]
+    audio = info.get('audio') or {}
+    return (
+        ext, video.get('codec_name'), video.get('pix_fmt'), video.get('color_transfer'),
+        video.get('width'), video.get('height'), _parse_fps(video.get('avg_frame_rate') or ''),
+        get_video_rotate_tag(path),
+        audio.get('codec_name'), audio.get('sample_rate'), audio.get('channels'), audio.get('channel_layout'),
+    )
+
+# Only short clips are batched: that's where ffmpeg/NVENC start-up dominates the encode time.
+# Batches are also kept small so results arrive steadily and one bad file only redoes a few others
+BATCH_MAX_CLIP_S = 30.0
+BATCH_MAX_FILES = 8
+
+def group_for_batch(paths, *, probes=None, skip_threshold_bps: float | None = SKIP_THRESHOLD_BPS,
+                    parallelism: int = 1) -> list:
+    """Split video paths into lists that can share one batched encode.
+    Files only batch together when container, video format (codec, pixel format, transfer, size, fps,
+    rotation) and audio layout all match. Files outside MP4/MOV, longer than BATCH_MAX_CLIP_S or
+    with an unknown duration, or that compress_file would pass through untouched, each end up in a
+    list of their own. Matching files are split into batches of at most BATCH_MAX_FILES, and into at
+    least `parallelism` batches when there are enough of them, so every video worker gets work.
+    probes is the {path: (duration_s, rotate_tag)} dict from probe_many(), if available.
+    """
+    probes = probes or {}
+    groups = {}
+    for path in paths:
+        ext = os.path.splitext(path)[1].lower()
+        duration_s = (probes.get(path) or (None, None))[0] or get_media_duration_seconds(path)
+        if (ext not in _BATCH_FORMATS or not duration_s or duration_s > BATCH_MAX_CLIP_S
+                or (skip_threshold_bps and is_already_compressed(path, duration_s, skip_threshold_bps))):
+            key = (path,)
+        else:
+            key = _batch_key(path, ext)
+        groups.setdefault(key, []).append(path)
+    batches = []
+    for group in groups.values():
+        size = max(1, min(BATCH_MAX_FILES, -(-len(group) // max(1, parallelism))))
+        batches.extend(group[i:i + size] for i in range(0, len(group), size))
+    return batches
+
+def _concat_escape(path: str) -> str:
+    return "'" + os.path.abspath(path).replace("'", "'\\''") + "'"
+
+def _batch_cmd(template: tuple, list_path: str, cuts, seg_format: str, seg_pattern: str) -> list:
+    """Turn a build_cmd() template into a concat-in/segment-out command.
+    Metadata, rotation and the final output are left to the per-file remux (_remux_cmd).
+    """
+    i = template.index('-i')
+    tail = template.index('-map_metadata')
+    cmd = render_cmd((*template[:i], '-f', 'concat', '-safe', '0', *template[i:tail]), list_path, None, None)
+    cut_list = ','.join(cuts)
+    return [
+        *cmd,
+        '-force_key_frames', cut_list,
+        '-f', 'segment', '-segment_times', cut_list,
+        '-segment_format', seg_format, '-reset_timestamps', '1',
+        seg_pattern,
+    ]
+
+def _remux_cmd(segment: str, source: str, output_path: str, rotate_tag, hvc1: bool) -> list:
+    """Stream-copy one segment to its output, taking metadata from its source like build_cmd does."""
+    return [
+        'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+        '-i', segment, '-i', source,
+        '-map', '0', '-c', 'copy',
+        *( ['-tag:v', 'hvc1'] if hvc1 else [] ),
+        '-map_metadata', '1', '-movflags', 'use_metadata_tags+faststart',
+        *( ['-metadata:s:v:0', f'rotate={rotate_tag}'] if rotate_tag else [] ),
+        output_path,
+    ]
+
+def _group_progress(files, durations, progress_cb):
+    """Map progress of the concatenated encode back to progress_cb(path, percent, speed_x, out_time_s)."""
+    starts = [0.0]
+    for d in durations:
+        starts.append(starts[-1] + d)
+    ends = starts[1:]
+    state = {'i': 0, 'pct': 0.0}
+
+    def _cb(percent, speed_x, out_s):
+        i = state['i']
+        if out_s is not None:
+            i = min(bisect.bisect_right(ends, out_s), len(files) - 1)
+            # Files before the current one are fully encoded
+            for j in range(state['i'], i):
+                progress_cb(files[j], 100.0, None, None)
+            state['i'] = i
+            state['pct'] = max(0.0, min(100.0, (out_s - starts[i]) / durations[i] * 100.0))
+            progress_cb(files[i], state['pct'], None, out_s - starts[i])
+        elif speed_x is not None:
+            progress_cb(files[i], state['pct'], speed_x, None)
+        elif percent >= 100.0:
+            for j in range(i, len(files)):
+                progress_cb(files[j], 100.0, None, None)
+
+    return _cb
+
+def _compress_group(files, output_dir, durations, progress_cb=None) -> dict:
+    """Encode a homogeneous group (see group_for_batch) through one ffmpeg/NVENC session.
+    The concat demuxer joins the inputs and the segment muxer splits the result again at
+    each input's boundary (forced keyframes there); each segment is then remuxed to its
+    output with the source's metadata. Encoder arguments come from build_cmd for the group's
+    profile, so they match what compress_file would use (gpu attempt, then swdec).
+    Returns {input_path: result} for the files that succeeded; callers redo the rest.
+    """
+    ext = os.path.splitext(files[0])[1].lower()
+    rotate_tag = get_video_rotate_tag(files[0])
+    cuts, t = [], 0.0
+    for d in durations[:-1]:
+        t += d
+        cuts.append(f'{t:.6f}')
+    group_cb = _group_progress(files, durations, progress_cb) if progress_cb is not None else None
+    with tempfile.TemporaryDirectory(dir=output_dir, prefix='.batch-') as tmp:
+        list_path = os.path.join(tmp, 'concat.txt')
+        with open(list_path, 'w') as f:
+            for path in files:
+                f.write(f"file {_concat_escape(path)}\n")
+        seg_pattern = os.path.join(tmp, f'out_%03d{ext}')
+        segments = [seg_pattern % i for i in range(len(files))]
+        for attempt in ('gpu', 'swdec'):
+            template = build_cmd(get_encode_profile(files[0], 'out' + ext, attempt, rotate_tag, group_cb is not None))
+            cmd = _batch_cmd(template, list_path, cuts, _BATCH_FORMATS[ext], seg_pattern)
+            if group_cb is not None:
+                ok, dur, _ = _run_ffmpeg_with_progress(cmd, sum(durations), group_cb)
+            else:
+                ok, dur, _ = _run_ffmpeg(cmd)
+            if ok and all(os.path.exists(seg) for seg in segments) and not os.path.exists(seg_pattern % len(files)):
+                break
+        else:
+            return {}
+        results = {}
+        for path, seg in zip(files, segments):
+            out = os.path.join(output_dir, os.path.basename(path))
+            ok, _, _ = _run_ffmpeg(_remux_cmd(seg, path, out, rotate_tag, 'hvc1' in template))
+            if ok:
+                results[path] = {'type': 'video-batch', 'duration_sec': dur / len(files), 'error': None, 'error_log': ''}
+        return results
+
+def compress_batch(files, output_dir, *, progress_cb=None, probes=None,
+                   skip_threshold_bps: float | None = SKIP_THRESHOLD_BPS) -> dict:
+    """Compress many videos, amortizing ffmpeg/NVENC start-up across files that share a format.
+    Files are grouped by group_for_batch(); each group of 2+ runs as one ffmpeg. Single files and
+    anything a batch could not produce go through compress_file.
+    progress_cb(input_path, percent, speed_x, out_time_s) reports per file.
+    Returns {input_path: result dict as from compress_file}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    probes = probes or {}
+    results = {}
+    for group in group_for_batch(files, probes=probes, skip_threshold_bps=skip_threshold_bps):
+        if len(group) > 1:
+            durations = [(probes.get(p) or (None, None))[0] or get_media_duration_seconds(p) for p in group]
+            results.update(_compress_group(group, output_dir, durations, progress_cb))
+        for path in group:
+            if path in results:
+                continue
+            duration_s, rotate_tag = probes.get(path) or (None, _PROBE)
+            file_cb = None
+            if progress_cb is not None:
+                file_cb = lambda pct, spd, t, path=path: progress_cb(path, pct, spd, t)
+            results[path] = compress_file(path, os.path.join(output_dir, os.path.basename(path)),
+                                          progress_cb=file_cb, duration_s=duration_s, rotate_tag=rotate_tag,
+                                          skip_threshold_bps=skip_threshold_bps)
+    return results
@@ -3,10 +3,12 @@ from tqdm import tqdm
 
 def count_files_by_extension(directory):
     extension_counts = {}
-    file_list = os.listdir(directory)
-    for filename in tqdm(file_list, desc="Counting files"):
-        if os.path.isfile(os.path.join(directory, filename)):
-            _, extension = os.path.splitext(filename)
+    with os.scandir(directory) as it:
+        entries = list(it)
+    for entry in tqdm(entries, desc="Counting files"):
+        # DirEntry.is_file() uses the cached d_type, avoiding a stat() per entry
+        if entry.is_file():
+            _, extension = os.path.splitext(entry.name)
             if extension:
                 extension = extension.lower()
                 extension_counts[extension] = extension_counts.get(extension, 0) + 1
@@ -1,9 +1,12 @@
 import os
 import time
+import argparse
 import threading
 import concurrent.futures
+import multiprocessing
 import queue
 from collections import deque
+from heapq import nlargest
 from rich.console import Console
 from rich.live import Live
 from rich.panel import Panel
@@ -12,13 +15,79 @@ import stats
 import compressor
 from ui import AppUI
 
+# Window for the files/s throughput shown in the pipeline stats
+RATE_WINDOW_S = 30.0
+# Interval between system/pipeline stats refreshes of the UI
+REFRESH_INTERVAL_S = 1.0
+# Minimum gap between redraws; events arriving sooner are shown by the next redraw
+DRAW_INTERVAL_S = 0.25
+# Number of in-progress files listed in the UI
+ACTIVE_SHOWN = 8
+
+# Event queue of the current image worker process, set by _init_image_worker
+_image_events = None
+
+def _init_image_worker(events):
+    global _image_events
+    _image_events = events
+
+def build_result(filename, input_path, output_path, result=None, error=None, original_size=None):
+    """Result dict for a finished file; sizes are measured here so callers only aggregate."""
+    if original_size is None:
+        original_size = stats.get_file_size(input_path)
+    if error is not None:
+        return {
+            'filename': filename,
+            'original_size': original_size,
+            'compressed_size': 0,
+            'ratio': 0.0,
+            'savings': 0,
+            'result': None,
+            'error': error,
+            'error_log': error,
+        }
+    compressed_size = stats.get_file_size(output_path)
+    return {
+        'filename': filename,
+        'original_size': original_size,
+        'compressed_size': compressed_size,
+        'ratio': (original_size / compressed_size) if compressed_size > 0 else 0,
+        'savings': original_size - compressed_size,
+        'result': result,
+        'error': result.get('error'),
+        'error_log': result.get('error_log', ''),
+    }
+
+def image_task(input_path, output_path, filename, original_size=None):
+    """Compress one image inside an image worker process and return its result dict."""
+    if _image_events is not None:
+        _image_events.put({'type': 'start', 'payload': {'filename': filename}})
+    try:
+        result = compressor.compress_file(input_path, output_path)
+        return build_result(filename, input_path, output_path, result, original_size=original_size)
+    except Exception as e:
+        return build_result(filename, input_path, output_path, error=str(e), original_size=original_size)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compress images and videos with NVENC.")
+    parser.add_argument(
+        '--skip-threshold-mbps', type=float, default=compressor.SKIP_THRESHOLD_BPS / 1_000_000,
+        help="Copy videos below this bitrate (or already HEVC/AV1) instead of re-encoding; 0 disables",
+    )
+    return parser.parse_args(argv)
+
 def main():
+    args = parse_args()
+    skip_threshold_bps = args.skip_threshold_mbps * 1_000_000
     input_directory = '/home/rishi/Desktop/mummy/Camera'
     output_directory = '/home/rishi/Desktop/mummy/Camera_compressed'
 
     if not os.path.exists(output_directory):
         os.makedirs(output_directory)
 
+    # Report disk I/O for the device we write to rather than the sum over all disks
+    stats.init_disk_io(output_directory)
+
     handle, error = stats.init_nvml()
     if error:
         console = Console()
@@ -27,228 +96,326 @@ def main():
 
     # Include all supported image/video types from compressor (case-insensitive)
     allowed_exts = set(compressor.IMAGE_EXTS) | set(compressor.VIDEO_EXTS)
-    files_to_process = [
-        f for f in os.listdir(input_directory)
-        if os.path.isfile(os.path.join(input_directory, f))
-        and os.path.splitext(f)[1].lower() in allowed_exts
-    ]
+    # One scandir pass: type and size come from the cached DirEntry instead of a stat() per call,
+    # and the lowercased extension is computed once here and passed along
+    files_to_process = []  # (filename, input_path, size, ext)
+    with os.scandir(input_directory) as it:
+        for e in it:
+            # is_file()/stat() follow symlinks, so linked inputs are processed like before
+            if not e.is_file():
+                continue
+            dot = e.name.rfind('.')
+            ext = e.name[dot:].lower() if dot > 0 else ''
+            if ext in allowed_exts:
+                files_to_process.append((e.name, e.path, e.stat().st_size, ext))
     total_files = len(files_to_process)
+    # Probe every video up front in parallel so workers don't each pay an ffprobe start-up
+    probes = compressor.probe_many(
+        path for _, path, _, ext in files_to_process if ext in compressor.VIDEO_EXTS
+    )
     app_ui = AppUI(total_files)
 
     console = Console()
-    total_original_size = 0
-    total_compressed_size = 0
-
     stop_event = threading.Event()
-    lock = threading.Lock()
-    # Track pipeline metrics
-    completed_timestamps = deque(maxlen=1000)  # timestamps of completed tasks
-    submitted_count = 0
-    completed_count = 0
-    active_jobs = 0
-    active_filenames = set()
-    active_file_sizes = {}
-    progress_by_file = {}
-    # Concurrency limits
-    video_sem = threading.Semaphore(5)
-    image_sem = threading.Semaphore(50)
-    # Failed log file (overwrite at start)
+    # Concurrency limits sized from the cgroup/host memory budget; each pool's max_workers is the
+    # admission control. Images run in their own process pool (one GIL per worker), so that pool
+    # is also capped at the core count
+    video_cap, image_cap = stats.detect_concurrency_limits()
+    # Short videos that share a format are encoded together through one ffmpeg
+    # (compressor.compress_batch), split so that all video_cap workers stay busy
+    batch_of = {}  # input_path -> tuple of the paths in its batch
+    for group in compressor.group_for_batch(probes.keys(), probes=probes, skip_threshold_bps=skip_threshold_bps,
+                                            parallelism=video_cap):
+        if len(group) > 1:
+            for path in group:
+                batch_of[path] = tuple(group)
+    # Failed log file (overwrite at start), kept open and written by a single writer thread
     failed_log_path = os.path.join(output_directory, 'failed.txt')
+    failed_q: "queue.Queue[str | None]" = queue.Queue()
     try:
-        with open(failed_log_path, 'w') as f:
-            f.write('')
+        failed_fp = open(failed_log_path, 'w', buffering=1)
     except Exception as e:
-        console = Console()
+        failed_fp = None
         console.print(f"Could not initialize failed.txt: {e}", style="bold red")
-    # UI event queue to marshal UI updates onto the main thread
-    ui_events: "queue.Queue[dict]" = queue.Queue()
+
+    def write_failed():
+        while True:
+            line = failed_q.get()
+            if line is None:
+                break
+            try:
+                failed_fp.write(line)
+            except Exception:
+                pass
+
+    failed_writer = None
+    if failed_fp is not None:
+        failed_writer = threading.Thread(target=write_failed, daemon=True)
+        failed_writer.start()
+    # UI event queue: workers and the submit loop only post events; update_stats applies them
+    ui_events: "queue.SimpleQueue[dict]" = queue.SimpleQueue()
+    # Image workers start from a forkserver: the pool is created after the stats and failed.txt
+    # threads are running, and a plain fork could copy a lock one of them holds
+    mp_ctx = multiprocessing.get_context('forkserver')
+    # Events from image worker processes (they cannot reach ui_events directly)
+    image_events = mp_ctx.Queue()
 
     def update_stats(live_instance):
+        # Pipeline state is owned by this thread alone, so it needs no lock
+        total_original_size = 0
+        total_compressed_size = 0
+        completed_timestamps = deque()  # completion times within the last RATE_WINDOW_S seconds
+        submitted_count = 0
+        completed_count = 0
+        active_jobs = 0
+        active_filenames = set()
+        active_file_sizes = {}  # filename -> (size, preformatted "filename (SIZE)" prefix)
+        progress_by_file = {}
+
+        def apply(ev):
+            nonlocal total_original_size, total_compressed_size, submitted_count, completed_count, active_jobs
+            etype = ev.get('type')
+            payload = ev['payload']
+            if etype == 'submit':
+                fname = payload['filename']
+                submitted_count += 1
+                active_file_sizes[fname] = (payload['size'], f"{fname} ({stats.format_size(payload['size'])})")
+                # Initialize progress to 0% for videos so UI doesn't show --%
+                if payload['is_video']:
+                    progress_by_file[fname] = (0.0, None)
+                # Update header/footer to reflect submission
+                app_ui.set_current_file(fname, index=payload['index'], total=total_files)
+                app_ui.update_footer_current_file(fname, stats.format_size(payload['size']))
+            elif etype == 'start':
+                fname = payload['filename']
+                # Skip if the completion was already accounted for
+                if fname in active_file_sizes and fname not in active_filenames:
+                    active_jobs += 1
+                    active_filenames.add(fname)
+            elif etype == 'file_complete':
+                res = payload
+                fname = res['filename']
+                total_original_size += res['original_size']
+                total_compressed_size += res['compressed_size']
+                completed_count += 1
+                completed_timestamps.append(time.time())
+                # Mark completion and remove from active
+                if fname in active_filenames:
+                    active_jobs -= 1
+                    active_filenames.discard(fname)
+                active_file_sizes.pop(fname, None)
+                progress_by_file.pop(fname, None)
+                app_ui.add_result(
+                    fname,
+                    stats.format_size(res['original_size']),
+                    stats.format_size(res['compressed_size']),
+                    res['ratio'],
+                    stats.format_size(res['savings'])
+                )
+                # If there was an error, surface it in the UI errors panel
+                if res.get('error'):
+                    app_ui.add_error(fname, res.get('error_log', ''))
+                # Running totals live here; the panel is only rebuilt when the formatted values change
+                total_ratio_local = (total_original_size / total_compressed_size) if total_compressed_size > 0 else 0
+                total_savings_str_local = stats.format_size(total_original_size - total_compressed_size)
+                app_ui.update_total_stats(total_savings_str_local, total_ratio_local)
+            elif etype == 'flush':
+                # Every event queued before this one has now been applied
+                payload.set()
+            elif etype == 'progress':
+                fname = payload.get('filename', '')
+                pct = payload.get('percent')
+                spd = payload.get('speed')
+                # Save latest per-file progress for in-progress list rendering
+                if fname:
+                    progress_by_file[fname] = (pct, spd)
+                app_ui.update_current_progress(fname, pct, spd)
+
+        # Block on the event queue between refresh ticks so events are applied as they arrive
+        next_refresh = time.monotonic()
+        next_draw = next_refresh
+        dirty = False  # events applied since the last redraw
+        tick = 0
         while not stop_event.is_set():
-            system_stats = stats.get_system_stats(handle)
-            app_ui.update_system_stats(system_stats)
-            # Drain UI events and apply updates from worker threads
+            # Wake for the next stats tick, or for the next allowed redraw if events are waiting to be shown
+            deadline = min(next_refresh, next_draw) if dirty else next_refresh
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                apply(ui_events.get(timeout=timeout))
+                dirty = True
+                while True:
+                    apply(ui_events.get_nowait())
+            except queue.Empty:
+                pass
+            now_mono = time.monotonic()
+            if now_mono < next_refresh:
+                # No stats are due: redraw applied events, at most once per DRAW_INTERVAL_S
+                if dirty and now_mono >= next_draw:
+                    live_instance.refresh()
+                    dirty = False
+                    next_draw = now_mono + DRAW_INTERVAL_S
+                continue
+            # Don't try to catch up on missed ticks after a slow refresh
+            next_refresh = max(next_refresh + REFRESH_INTERVAL_S, now_mono)
+            # System stats change slowly; gather them on every other UI tick
+            if tick % 2 == 0:
+                app_ui.update_system_stats(stats.get_system_stats(handle))
+            tick += 1
+            # Image worker processes report when they pick a job up
             try:
                 while True:
-                    ev = ui_events.get_nowait()
-                    etype = ev.get('type')
-                    if etype == 'file_complete':
-                        res = ev['payload']
-                        app_ui.add_result(
-                            res['filename'],
-                            stats.format_size(res['original_size']),
-                            stats.format_size(res['compressed_size']),
-                            res['ratio'],
-                            stats.format_size(res['savings'])
-                        )
-                        # If there was an error, surface it in the UI errors panel
-                        if res.get('error'):
-                            app_ui.add_error(res['filename'], res.get('error_log', ''))
-                        total_ratio_local = (total_original_size / total_compressed_size) if total_compressed_size > 0 else 0
-                        total_savings_str_local = stats.format_size(total_original_size - total_compressed_size)
-                        app_ui.update_total_stats(total_savings_str_local, total_ratio_local)
-                    elif etype == 'progress':
-                        payload = ev['payload']
-                        fname = payload.get('filename', '')
-                        pct = payload.get('percent')
-                        spd = payload.get('speed')
-                        # Save latest per-file progress for in-progress list rendering
-                        if fname:
-                            with lock:
-                                progress_by_file[fname] = (pct, spd)
-                        app_ui.update_current_progress(fname, pct, spd)
-                    ui_events.task_done()
+                    apply(image_events.get_nowait())
             except queue.Empty:
                 pass
             # Update pipeline stats (active, queued, completed, throughput, active file list)
-            with lock:
-                if completed_timestamps:
-                    # Compute rate over last 30 seconds
-                    now = time.time()
-                    window = 30.0
-                    # Count how many completions within window
-                    count_window = sum(1 for t in completed_timestamps if now - t <= window)
-                    rate = count_window / window
-                else:
-                    rate = 0.0
-                queued = max(submitted_count - completed_count - active_jobs, 0)
-                cur_active = active_jobs
-                completed_local = completed_count
-                # Build preformatted active lines: "filename (SIZE)", sorted by size desc
-                items = [(name, active_file_sizes.get(name, 0)) for name in active_filenames]
-                items.sort(key=lambda x: x[1], reverse=True)
-                active_lines = []
-                for name, sz in items:
-                    pct, spd = progress_by_file.get(name, (None, None))
-                    pct_str = f" — {pct:.1f}%" if isinstance(pct, (int, float)) else " — --%"
-                    spd_str = f" @ {spd:.2f}x" if isinstance(spd, (int, float)) else ""
-                    active_lines.append(f"{name} ({stats.format_size(sz)}){pct_str}{spd_str}")
-            app_ui.update_pipeline_stats(cur_active, queued, completed_local, rate, active_lines)
+            # Rate over the last 30 seconds: evict expired timestamps from the left, count what remains
+            now = time.time()
+            while completed_timestamps and now - completed_timestamps[0] > RATE_WINDOW_S:
+                completed_timestamps.popleft()
+            rate = len(completed_timestamps) / RATE_WINDOW_S
+            queued = max(submitted_count - completed_count - active_jobs, 0)
+            # Active lines for the largest ACTIVE_SHOWN files: the "filename (SIZE)" prefix was
+            # formatted at submit time, only the progress suffix changes per tick
+            top = nlargest(ACTIVE_SHOWN, ((n, active_file_sizes[n]) for n in active_filenames),
+                           key=lambda item: item[1][0])
+            more = len(active_filenames) - len(top)
+            active_lines = []
+            for name, (_, prefix) in top:
+                pct, spd = progress_by_file.get(name, (None, None))
+                pct_str = f" — {pct:.1f}%" if isinstance(pct, (int, float)) else " — --%"
+                spd_str = f" @ {spd:.2f}x" if isinstance(spd, (int, float)) else ""
+                active_lines.append(f"{prefix}{pct_str}{spd_str}")
+            app_ui.update_pipeline_stats(active_jobs, queued, completed_count, rate, active_lines, more)
             live_instance.refresh()
-            time.sleep(1)
+            dirty = False
+            next_draw = time.monotonic() + DRAW_INTERVAL_S
+        # Flush anything applied since the last draw
+        live_instance.refresh()
 
     start_time = time.time()
 
-    with Live(app_ui.layout, console=console, screen=True, redirect_stderr=False) as live:
+    # Only update_stats (and the final footer below) redraw; no competing auto-refresh thread
+    with Live(app_ui.layout, console=console, screen=True, auto_refresh=False, redirect_stderr=False) as live:
         stats_thread = threading.Thread(target=update_stats, args=(live,))
         stats_thread.start()
 
-        # Concurrent execution: allow enough threads to service both video and image limits
-        max_workers = max( video_sem._value + image_sem._value, (os.cpu_count() or 2) )
-        futures = []
+        futures = {}  # future -> [(filename, input_path, original_size)] of the files it covers
 
-        def task(input_path, output_path, filename, ext):
-            nonlocal total_original_size, total_compressed_size, completed_count, active_jobs
-            # Mark as running when the worker actually starts
-            with lock:
-                active_jobs += 1
-                active_filenames.add(filename)
-            # Acquire per-type semaphore
-            sem = video_sem if ext in compressor.VIDEO_EXTS else image_sem
-            sem.acquire()
+        def finish(items, fut):
+            """Report a finished job (runs in the main thread for both pools and for batches)."""
             try:
-                # Do compression
-                if ext in compressor.VIDEO_EXTS:
-                    # Compute duration and pass a progress callback that enqueues updates
-                    dur = compressor.get_media_duration_seconds(input_path)
-                    def _cb(percent, speed_x, out_time_s):
-                        try:
-                            ui_events.put({'type': 'progress', 'payload': {
-                                'filename': filename,
-                                'percent': percent,
-                                'speed': speed_x,
-                            }})
-                        except Exception:
-                            pass
-                    result = compressor.compress_file(input_path, output_path, progress_cb=_cb, duration_s=dur)
-                else:
-                    result = compressor.compress_file(input_path, output_path)
-                compressed_size = stats.get_file_size(output_path)
-                original_size_local = stats.get_file_size(input_path)
-                ratio = (original_size_local / compressed_size) if compressed_size > 0 else 0
-                savings = original_size_local - compressed_size
-                # Update totals under lock
-                with lock:
-                    total_original_size += original_size_local
-                    total_compressed_size += compressed_size
-                res = {
-                    'filename': filename,
-                    'original_size': original_size_local,
-                    'compressed_size': compressed_size,
-                    'ratio': ratio,
-                    'savings': savings,
-                    'result': result,
-                    'error': result.get('error'),
-                    'error_log': result.get('error_log', ''),
-                }
+                results = fut.result()
+                if not isinstance(results, list):
+                    results = [results]
             except Exception as e:
-                original_size_local = stats.get_file_size(input_path)
-                res = {
-                    'filename': filename,
-                    'original_size': original_size_local,
-                    'compressed_size': 0,
-                    'ratio': 0.0,
-                    'savings': 0,
-                    'result': None,
-                    'error': str(e),
-                    'error_log': str(e),
-                }
-            finally:
-                # Mark completion and remove from active
-                with lock:
-                    completed_count += 1
-                    completed_timestamps.append(time.time())
-                    active_jobs -= 1
-                    active_filenames.discard(filename)
-                    active_file_sizes.pop(filename, None)
-                    progress_by_file.pop(filename, None)
-                    # Append to failed.txt if error
-                    if res.get('error'):
-                        try:
-                            with open(failed_log_path, 'a') as f:
-                                f.write(f"{filename}: {res.get('error')}\n{res.get('error_log','')}\n---\n")
-                        except Exception:
-                            pass
-                # Release semaphore
-                try:
-                    sem.release()
-                except Exception:
-                    pass
-                # Send UI update event to main thread for both success and error
+                results = [build_result(filename, input_path, None, error=str(e), original_size=original_size)
+                           for filename, input_path, original_size in items]
+            for res in results:
+                # Hand failures to the failed.txt writer
+                if res.get('error') and failed_writer is not None:
+                    failed_q.put(f"{res['filename']}: {res.get('error')}\n{res.get('error_log','')}\n---\n")
+                # Send UI update event to the stats thread for both success and error
                 ui_events.put({'type': 'file_complete', 'payload': res})
-            return res
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            for idx, filename in enumerate(files_to_process, start=1):
-                input_path = os.path.join(input_directory, filename)
+        def post_progress(filename, percent, speed_x):
+            try:
+                ui_events.put({'type': 'progress', 'payload': {
+                    'filename': filename,
+                    'percent': percent,
+                    'speed': speed_x,
+                }})
+            except Exception:
+                pass
+
+        def video_task(input_path, output_path, filename, original_size):
+            # Mark as running when the worker actually starts
+            ui_events.put({'type': 'start', 'payload': {'filename': filename}})
+            try:
+                # Use the pre-probed duration and pass a progress callback that enqueues updates
+                dur, rotate_tag = probes.get(input_path, (None, None))
+                def _cb(percent, speed_x, out_time_s):
+                    post_progress(filename, percent, speed_x)
+                result = compressor.compress_file(input_path, output_path, progress_cb=_cb,
+                                                  duration_s=dur, rotate_tag=rotate_tag,
+                                                  skip_threshold_bps=skip_threshold_bps)
+                return build_result(filename, input_path, output_path, result, original_size=original_size)
+            except Exception as e:
+                return build_result(filename, input_path, output_path, error=str(e), original_size=original_size)
+
+        def batch_task(items):
+            """Compress a group from group_for_batch in one ffmpeg; returns one result per file."""
+            for filename, _, _ in items:
+                ui_events.put({'type': 'start', 'payload': {'filename': filename}})
+            def _cb(path, percent, speed_x, out_time_s):
+                post_progress(os.path.basename(path), percent, speed_x)
+            try:
+                results = compressor.compress_batch([path for _, path, _ in items], output_directory,
+                                                    progress_cb=_cb, probes=probes,
+                                                    skip_threshold_bps=skip_threshold_bps)
+                error = 'batch_failed'
+            except Exception as e:
+                results, error = {}, str(e)
+            out = []
+            for filename, input_path, original_size in items:
                 output_path = os.path.join(output_directory, filename)
+                if input_path in results:
+                    out.append(build_result(filename, input_path, output_path, results[input_path],
+                                            original_size=original_size))
+                else:
+                    out.append(build_result(filename, input_path, output_path, error=error,
+                                            original_size=original_size))
+            return out
 
-                # Update header/footer to reflect submission
-                app_ui.set_current_file(filename, index=idx, total=total_files)
-                original_size = stats.get_file_size(input_path)
-                app_ui.update_footer_current_file(filename, stats.format_size(original_size))
+        # Videos block on ffmpeg subprocesses and stay on threads; in-process image encodes get
+        # a process per core so they are not serialized on the GIL
+        with concurrent.futures.ThreadPoolExecutor(max_workers=video_cap, thread_name_prefix='vid') as vid_pool, \
+                concurrent.futures.ProcessPoolExecutor(
+                    max_workers=min(image_cap, os.cpu_count() or 2),
+                    mp_context=mp_ctx, initializer=_init_image_worker, initargs=(image_events,),
+                ) as img_pool:
+            pending_batches = {}  # batch -> items submitted so far
+            for idx, (filename, input_path, original_size, ext) in enumerate(files_to_process, start=1):
+                output_path = os.path.join(output_directory, filename)
+                is_video = ext in compressor.VIDEO_EXTS
 
                 # Submit task
-                with lock:
-                    submitted_count += 1
-                    active_file_sizes[filename] = original_size
-                    # Initialize progress to 0% for videos so UI doesn't show --%
-                    if os.path.splitext(filename)[1].lower() in compressor.VIDEO_EXTS:
-                        progress_by_file[filename] = (0.0, None)
-                fut = executor.submit(task, input_path, output_path, filename, os.path.splitext(filename)[1].lower())
-                futures.append(fut)
-
+                ui_events.put({'type': 'submit', 'payload': {
+                    'filename': filename,
+                    'size': original_size,
+                    'is_video': is_video,
+                    'index': idx,
+                }})
+                item = (filename, input_path, original_size)
+                batch = batch_of.get(input_path)
+                if batch is not None:
+                    # Submit the batch once its last member has been announced
+                    items = pending_batches.setdefault(batch, [])
+                    items.append(item)
+                    if len(items) < len(batch):
+                        continue
+                    fut = vid_pool.submit(batch_task, items)
+                    futures[fut] = items
+                    continue
+                if is_video:
+                    fut = vid_pool.submit(video_task, input_path, output_path, filename, original_size)
+                else:
+                    fut = img_pool.submit(image_task, input_path, output_path, filename, original_size)
+                futures[fut] = [item]
 
-            # Wait for all futures to complete
-            concurrent.futures.wait(futures, return_when=concurrent.futures.ALL_COMPLETED)
+            # Report jobs as they finish, as run_pipeline does
+            for fut in concurrent.futures.as_completed(futures):
+                finish(futures[fut], fut)
 
-        # Wait for all UI events to be processed so progress reflects true completion
-        while True:
-            with lock:
-                all_done = (completed_count == submitted_count)
-            if all_done and ui_events.empty():
-                break
-            time.sleep(0.1)
+        # Wait until the stats thread has applied every event so progress reflects true completion
+        # (the queue is FIFO, so a flush marker is applied after everything queued before it)
+        flushed = threading.Event()
+        ui_events.put({'type': 'flush', 'payload': flushed})
+        flushed.wait()
+        # Flush and close failed.txt once every failure has been queued
+        if failed_writer is not None:
+            failed_q.put(None)
+            failed_writer.join()
+            failed_fp.close()
 
         # After processing completes, keep the UI open and show completion info
         total_time = time.time() - start_time
@@ -261,6 +428,7 @@ def main():
         # Stop background updates before waiting for user input
         stop_event.set()
         stats_thread.join()
+        image_events.close()
 
         # Read input within Live context so the UI remains visible
         while True:
@@ -274,4 +442,4 @@ def main():
     stats.shutdown_nvml()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,8 +1,10 @@
 
 import os
 import psutil
+import pynvml
 from pynvml import *
 import time
+from functools import lru_cache
 
 def get_file_size(file_path):
     try:
@@ -24,14 +26,90 @@ def shutdown_nvml():
 # Module-level state for disk I/O sampling
 _last_disk = None
 _last_time = None
+_last_disk_source = None  # device name the baseline was read from, or None for the aggregate
+# perdisk key of the device holding the output directory; None samples the aggregate
+_disk_io_device = None
+
+# Temperature and disk I/O are slow to read and change slowly; refresh them at most every few seconds
+SLOW_STATS_TTL_S = 3.0
+_cpu_temp_cache = (None, "N/A")  # (monotonic ts, value)
+_disk_io_cache = (None, ("N/A", "N/A"))
+
+# Resolved CPU thermal-zone temp file, found on the first successful sysfs read
+_thermal_temp_path = None
+
+# Upper bounds on concurrent video (NVENC session) and image jobs
+VIDEO_CAP = 5
+IMAGE_CAP = 50
+# Rough peak memory per concurrent job, used to size the worker pools
+VIDEO_JOB_MEM = 200 << 20
+IMAGE_JOB_MEM = 50 << 20
+_CGROUP_MEM_LIMIT_FILES = (
+    "/sys/fs/cgroup/memory.max",                     # cgroup v2
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",   # cgroup v1
+)
+
+def _memory_budget_bytes():
+    """Memory available to this process: the cgroup limit if one is set, else physical RAM."""
+    total = psutil.virtual_memory().total
+    for path in _CGROUP_MEM_LIMIT_FILES:
+        try:
+            with open(path, "r") as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value == "max":
+            return total
+        try:
+            # v1 reports "unlimited" as a huge page-aligned number, so clamp to RAM
+            return min(int(value), total)
+        except ValueError:
+            continue
+    return total
+
+def detect_concurrency_limits():
+    """Return (video, image) job limits that fit the container's memory budget."""
+    mem_bytes = _memory_budget_bytes()
+    video = max(1, min(VIDEO_CAP, mem_bytes // VIDEO_JOB_MEM // 2))
+    image = max(2, min(IMAGE_CAP, mem_bytes // IMAGE_JOB_MEM))
+    return video, image
+
+def init_disk_io(path):
+    """Sample disk I/O for the device holding path only, if it can be resolved."""
+    global _disk_io_device, _last_disk, _last_time, _last_disk_source
+    _disk_io_device = None
+    try:
+        dev = os.stat(path).st_dev
+        per_disk = psutil.disk_io_counters(perdisk=True) or {}
+        for part in psutil.disk_partitions(all=False):
+            try:
+                if os.stat(part.mountpoint).st_dev != dev:
+                    continue
+            except OSError:
+                continue
+            name = os.path.basename(part.device)
+            if name in per_disk:
+                _disk_io_device = name
+                break
+    except Exception:
+        pass
+    # Counters from a different source are not comparable; start the delta over
+    _last_disk = _last_time = _last_disk_source = None
+    return _disk_io_device
 
 def _disk_io_rate_mb_s():
-    global _last_disk, _last_time
+    global _last_disk, _last_time, _last_disk_source
     try:
         now = time.time()
-        cur = psutil.disk_io_counters()
-        if _last_disk is None or _last_time is None:
-            _last_disk, _last_time = cur, now
+        source, cur = None, None
+        if _disk_io_device is not None:
+            cur = psutil.disk_io_counters(perdisk=True).get(_disk_io_device)
+            source = _disk_io_device if cur is not None else None
+        if cur is None:
+            cur = psutil.disk_io_counters()
+        # A baseline from the other counter source (per-disk vs aggregate) would give a bogus delta
+        if _last_disk is None or _last_time is None or source != _last_disk_source:
+            _last_disk, _last_time, _last_disk_source = cur, now, source
             return "N/A", "N/A"
         dt = max(now - _last_time, 1e-6)
         read_mb_s = (cur.read_bytes - _last_disk.read_bytes) / dt / (1024 * 1024)
@@ -42,6 +120,13 @@ def _disk_io_rate_mb_s():
         return "N/A", "N/A"
 def _read_sysfs_cpu_temp():
     """Attempt to read CPU temperature from Linux sysfs thermal zones."""
+    global _thermal_temp_path
+    if _thermal_temp_path is not None:
+        try:
+            with open(_thermal_temp_path, "r") as tf:
+                return int(tf.read().strip()) / 1000.0
+        except Exception:
+            _thermal_temp_path = None
     base = "/sys/class/thermal"
     try:
         if not os.path.isdir(base):
@@ -55,9 +140,11 @@ def _read_sysfs_cpu_temp():
                     sensor_type = f.read().strip().lower()
                 # Heuristics for CPU related zones
                 if any(key in sensor_type for key in ["cpu", "x86", "package", "soc", "acpitz", "cpu_thermal"]):
-                    with open(os.path.join(base, name, "temp"), "r") as tf:
+                    temp_path = os.path.join(base, name, "temp")
+                    with open(temp_path, "r") as tf:
                         millideg = int(tf.read().strip())
-                        return millideg / 1000.0
+                    _thermal_temp_path = temp_path
+                    return millideg / 1000.0
             except Exception:
                 continue
     except Exception:
@@ -101,33 +188,100 @@ def get_cpu_temp_str():
         return f"{sysfs_temp:.0f}°C"
     return "N/A"
 
+# NVML metrics fetched together in one nvmlDeviceGetFieldValues call; names are resolved on first
+# use because older pynvml releases don't define every field ID
+_NVML_FIELD_NAMES = {
+    "power_mw": "NVML_FI_DEV_POWER_INSTANT",
+    "pcie_rx_bytes": "NVML_FI_DEV_PCIE_COUNT_RX_BYTES",
+    "pcie_tx_bytes": "NVML_FI_DEV_PCIE_COUNT_TX_BYTES",
+}
+_nvml_fields = None  # [(key, field_id)] supported by this pynvml
+# Field value union member to read for each NVML value type
+_NVML_VALUE_ATTR = {
+    getattr(pynvml, "NVML_VALUE_TYPE_DOUBLE", 0): "dVal",
+    getattr(pynvml, "NVML_VALUE_TYPE_UNSIGNED_INT", 1): "uiVal",
+    getattr(pynvml, "NVML_VALUE_TYPE_UNSIGNED_LONG", 2): "ulVal",
+    getattr(pynvml, "NVML_VALUE_TYPE_UNSIGNED_LONG_LONG", 3): "ullVal",
+    getattr(pynvml, "NVML_VALUE_TYPE_SIGNED_LONG_LONG", 4): "sllVal",
+}
+_last_pcie = None  # (time, rx_bytes, tx_bytes)
+
+def _nvml_field_values(handle):
+    """Return {key: value} for the batched NVML fields the driver answered successfully."""
+    global _nvml_fields
+    if _nvml_fields is None:
+        _nvml_fields = [
+            (key, getattr(pynvml, name)) for key, name in _NVML_FIELD_NAMES.items() if hasattr(pynvml, name)
+        ]
+    if not _nvml_fields or not hasattr(pynvml, "nvmlDeviceGetFieldValues"):
+        return {}
+    try:
+        raw = nvmlDeviceGetFieldValues(handle, [fid for _, fid in _nvml_fields])
+    except NVMLError:
+        return {}
+    values = {}
+    for (key, _), fv in zip(_nvml_fields, raw):
+        # Fields the driver could not read come back with a non-zero nvmlReturn; leave them out
+        if fv.nvmlReturn != NVML_SUCCESS:
+            continue
+        attr = _NVML_VALUE_ATTR.get(fv.valueType)
+        if attr is not None:
+            values[key] = getattr(fv.value, attr)
+    return values
+
+def _pcie_rate_mb_s(rx_bytes, tx_bytes):
+    """Turn cumulative PCIe byte counters into MB/s since the previous sample."""
+    global _last_pcie
+    now = time.time()
+    last, _last_pcie = _last_pcie, (now, rx_bytes, tx_bytes)
+    if last is None:
+        return "N/A", "N/A"
+    dt = max(now - last[0], 1e-6)
+    # Clamp: a counter reset (driver reload, wrap) would otherwise show a negative rate
+    rx = max(0, rx_bytes - last[1]) / dt / (1024 * 1024)
+    tx = max(0, tx_bytes - last[2]) / dt / (1024 * 1024)
+    return f"{rx:.2f} MB/s", f"{tx:.2f} MB/s"
+
 def get_system_stats(handle):
+    global _cpu_temp_cache, _disk_io_cache
+    now = time.monotonic()
     # Always compute CPU and RAM, independent of GPU availability
-    cpu_usage = psutil.cpu_percent()
+    cpu_usage = psutil.cpu_percent(interval=None)
     mem = psutil.virtual_memory()
     ram_used = mem.used
     ram_total = mem.total
     ram_percent = mem.percent
-    cpu_temp_str = get_cpu_temp_str()
+    ts, cpu_temp_str = _cpu_temp_cache
+    if ts is None or now - ts >= SLOW_STATS_TTL_S:
+        cpu_temp_str = get_cpu_temp_str()
+        _cpu_temp_cache = (now, cpu_temp_str)
 
     # GPU stats only if handle is available
     if handle:
         try:
+            # Power and PCIe byte counters in one driver round-trip; the rest have no field IDs
+            fields = _nvml_field_values(handle)
             gpu_util = nvmlDeviceGetUtilizationRates(handle)
             gpu_mem = nvmlDeviceGetMemoryInfo(handle)
             gpu_temp = nvmlDeviceGetTemperature(handle, NVML_TEMPERATURE_GPU)
-            power_usage = nvmlDeviceGetPowerUsage(handle) / 1000.0  # In Watts
+            power_mw = fields.get("power_mw")
+            if power_mw is None:
+                power_mw = nvmlDeviceGetPowerUsage(handle)
+            power_usage = power_mw / 1000.0  # In Watts
             # NVENC/NVDEC engine utilization
             enc_util, _ = nvmlDeviceGetEncoderUtilization(handle)
             dec_util, _ = nvmlDeviceGetDecoderUtilization(handle)
-            # PCIe throughput (KB/s) -> MB/s
-            try:
-                rx_kb = nvmlDeviceGetPcieThroughput(handle, NVML_PCIE_UTIL_RX_BYTES)
-                tx_kb = nvmlDeviceGetPcieThroughput(handle, NVML_PCIE_UTIL_TX_BYTES)
-                pcie_rx = f"{rx_kb / 1024:.2f} MB/s"
-                pcie_tx = f"{tx_kb / 1024:.2f} MB/s"
-            except NVMLError:
-                pcie_rx = pcie_tx = "N/A"
+            if "pcie_rx_bytes" in fields and "pcie_tx_bytes" in fields:
+                pcie_rx, pcie_tx = _pcie_rate_mb_s(fields["pcie_rx_bytes"], fields["pcie_tx_bytes"])
+            else:
+                # PCIe throughput (KB/s) -> MB/s; each call samples the bus for a short window
+                try:
+                    rx_kb = nvmlDeviceGetPcieThroughput(handle, NVML_PCIE_UTIL_RX_BYTES)
+                    tx_kb = nvmlDeviceGetPcieThroughput(handle, NVML_PCIE_UTIL_TX_BYTES)
+                    pcie_rx = f"{rx_kb / 1024:.2f} MB/s"
+                    pcie_tx = f"{tx_kb / 1024:.2f} MB/s"
+                except NVMLError:
+                    pcie_rx = pcie_tx = "N/A"
             gpu_usage_str = f"{gpu_util.gpu}%"
             gpu_temp_str = f"{gpu_temp}°C"
             gpu_ram_str = f"{gpu_mem.used / gpu_mem.total * 100:.2f}% ({format_size(gpu_mem.used)})"
@@ -139,8 +293,11 @@ def get_system_stats(handle):
     else:
         gpu_usage_str = gpu_temp_str = gpu_ram_str = gpu_power_str = gpu_enc_str = gpu_dec_str = pcie_rx = pcie_tx = "N/A"
 
-    # Disk I/O rates
-    disk_read, disk_write = _disk_io_rate_mb_s()
+    # Disk I/O rates (averaged over the slow-stats interval)
+    ts, (disk_read, disk_write) = _disk_io_cache
+    if ts is None or now - ts >= SLOW_STATS_TTL_S:
+        disk_read, disk_write = _disk_io_rate_mb_s()
+        _disk_io_cache = (now, (disk_read, disk_write))
 
     return {
         "CPU Usage": f"{cpu_usage}%",
@@ -158,11 +315,15 @@ def get_system_stats(handle):
         "Disk Write": disk_write,
     }
 
+_SIZE_UNITS = (("bytes", 1), ("KB", 1024), ("MB", 1024 * 1024), ("GB", 1024 ** 3))
+
+@lru_cache(maxsize=256)
 def format_size(size_bytes):
-    if size_bytes > 1024 * 1024:
-        return f"{size_bytes / (1024 * 1024):.2f} MB"
-    elif size_bytes > 1024:
-        return f"{size_bytes / 1024:.2f} KB"
-    else:
+    # Unit index from the bit length (10 bits per unit) instead of a comparison chain;
+    # cached because active file sizes are re-formatted on every refresh
+    i = min(max(0, (int(size_bytes).bit_length() - 1) // 10), 3)
+    if i == 0:
         return f"{size_bytes} bytes"
+    name, div = _SIZE_UNITS[i]
+    return f"{size_bytes / div:.2f} {name}"
 
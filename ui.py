@@ -18,17 +18,46 @@ def make_layout() -> Layout:
     layout["side"].split(Layout(name="system_stats"), Layout(name="total_stats"))
     return layout
 
+def _first_lines(s, n=2):
+    """First n lines of s, found with str.find so long logs aren't split in full."""
+    out = []
+    i = 0
+    for _ in range(n):
+        j = s.find("\n", i)
+        out.append(s[i:j] if j >= 0 else s[i:])
+        if j < 0:
+            break
+        i = j + 1
+    return out
+
+class DequeTable:
+    """Renderable that builds its table from a deque at render time, so adding a row is O(1)."""
+
+    def __init__(self, title, columns, rows):
+        self.title = title
+        self.columns = columns  # [(header, style)]
+        self.rows = rows
+
+    def __rich_console__(self, console, options):
+        table = Table(title=self.title)
+        for header, style in self.columns:
+            table.add_column(header, style=style)
+        # Snapshot first: rows are appended from the stats thread while Live renders
+        for row in list(self.rows):
+            table.add_row(*row)
+        yield table
+
 class AppUI:
     def __init__(self, total_files):
         self.layout = make_layout()
-        self.results_table = Table(title="File Compression Statistics (latest 40)")
-        self.results_table.add_column("Filename", style="cyan")
-        self.results_table.add_column("Original Size", style="magenta")
-        self.results_table.add_column("Compressed Size", style="green")
-        self.results_table.add_column("Ratio", style="blue")
-        self.results_table.add_column("Savings", style="yellow")
         # Keep only the latest 40 results, newest first
         self._results = deque(maxlen=40)
+        self.results_table = DequeTable(
+            "File Compression Statistics (latest 40)",
+            [("Filename", "cyan"), ("Original Size", "magenta"), ("Compressed Size", "green"),
+             ("Ratio", "blue"), ("Savings", "yellow")],
+            self._results,
+        )
 
         # TQDM-like progress at the top: description | count | bar | percent | elapsed | remaining
         # Use expand to keep alignment stable across refreshes
@@ -47,11 +76,9 @@ class AppUI:
         self.layout["results"].update(self.results_table)
 
         # Errors table for failed jobs
-        self._errors = []  # list of (filename, error_snippet)
         self._errors_max = 20
-        self.errors_table = Table(title="Failed Jobs (latest)")
-        self.errors_table.add_column("File", style="red")
-        self.errors_table.add_column("Error", style="white")
+        self._errors = deque(maxlen=self._errors_max)  # (filename, error_snippet)
+        self.errors_table = DequeTable("Failed Jobs (latest)", [("File", "red"), ("Error", "white")], self._errors)
         self.layout["errors"].update(Panel(self.errors_table, title="Errors", border_style="red"))
 
         # Track last-known totals and pipeline status for consistent rendering
@@ -71,6 +98,9 @@ class AppUI:
         self.layout["system_stats"].update(Panel(stats_table, title="Live Stats", border_style="blue"))
 
     def update_total_stats(self, total_savings, total_ratio):
+        # Most completions don't change the displayed totals; skip the panel rebuild then
+        if total_savings == self._last_total_savings and f"{total_ratio:.2f}" == f"{self._last_total_ratio:.2f}":
+            return
         # Persist values for re-rendering together with pipeline status
         self._last_total_savings = total_savings
         self._last_total_ratio = total_ratio
@@ -80,15 +110,16 @@ class AppUI:
         )
         self.layout["total_stats"].update(total_stats_panel)
 
-    def update_pipeline_stats(self, active_jobs, queued_jobs, completed_jobs, rate_files_per_sec, active_lines):
+    def update_pipeline_stats(self, active_jobs, queued_jobs, completed_jobs, rate_files_per_sec, active_lines, hidden=0):
         # Update pipeline status and re-render the total stats panel with last totals
         self._pipeline_status = (
             f"Active: {active_jobs} | Completed: {completed_jobs} | Queued: {queued_jobs} | Rate: {rate_files_per_sec:.2f} files/s"
         )
-        # Prepare an 'In Progress' block listing current files with sizes (limit to 8 for readability)
+        # Prepare an 'In Progress' block listing current files with sizes (limit to 8 for readability);
+        # hidden counts active files the caller already left out
         if active_lines:
             display = active_lines[:8]
-            more = len(active_lines) - len(display)
+            more = len(active_lines) - len(display) + hidden
             lines = [f" - {line}" for line in display]
             if more > 0:
                 lines.append(f" (+{more} more)")
@@ -115,19 +146,8 @@ class AppUI:
         self.layout["total_stats"].update(total_stats_panel)
 
     def add_result(self, filename, original_size, compressed_size, ratio, savings):
-        # Store newest first
+        # Store newest first; the deque drops the oldest and the table picks it up on the next render
         self._results.appendleft((filename, original_size, compressed_size, f"{ratio:.2f}x", savings))
-        # Rebuild the table to ensure newest appears at the top and limit to 40
-        new_table = Table(title="File Compression Statistics (latest 40)")
-        new_table.add_column("Filename", style="cyan")
-        new_table.add_column("Original Size", style="magenta")
-        new_table.add_column("Compressed Size", style="green")
-        new_table.add_column("Ratio", style="blue")
-        new_table.add_column("Savings", style="yellow")
-        for row in self._results:
-            new_table.add_row(*row)
-        self.results_table = new_table
-        self.layout["results"].update(self.results_table)
         self.progress.update(self.task_id, advance=1)
 
     def set_current_file(self, filename, index=None, total=None):
@@ -147,18 +167,9 @@ class AppUI:
 
     def add_error(self, filename, error_log: str):
         # Keep a short snippet to avoid blowing up the UI
-        snippet = (error_log or "").splitlines()[:2]
+        snippet = _first_lines(error_log or "")
         short = " ".join(s.strip() for s in snippet if s.strip())
         if not short:
             short = "ffmpeg failed"
+        # Keeps the last N; rendered lazily by errors_table
         self._errors.append((filename, short))
-        # Trim to last N
-        self._errors = self._errors[-self._errors_max:]
-        # Rebuild the table
-        new_table = Table(title="Failed Jobs (latest)")
-        new_table.add_column("File", style="red")
-        new_table.add_column("Error", style="white")
-        for f, e in self._errors:
-            new_table.add_row(f, e)
-        self.errors_table = new_table
-        self.layout["errors"].update(Panel(self.errors_table, title="Errors", border_style="red"))